@@ -0,0 +1,122 @@
+"""
+Compara a classificação de prazos de analyze_deadline_with_reason (colunas inteiras + motivo categórico, totais tirados
+do cubo de atendimentos) com a versão antiga (apply linha a linha e value_counts) numa exportação de RAs sintética,
+e confere que os resultados são iguais:
+contagens, percentuais e a contagem de motivos fora do prazo (inclusive a ordem e motivos vazios).
+Também compara a contagem de dias úteis (np.busday_count com os feriados) com um laço dia a dia por linha.
+
+Uso (na raiz do projeto):
+    python benchmarks/deadline_analysis.py
+    python benchmarks/deadline_analysis.py 10000 500000
+"""
+import os
+import sys
+import time
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from commercial.analysis import classify_deadlines, count_by_dimensions, merge_cube_parts, summarize_cube
+from commercial.holidays import holidays_for_years
+
+
+REASONS = ["CONCLUSAO DO SERVICO", "NAO CONCLUSAO DO SERVICO", "SERVICO JA EXECUTADO", "ATUALIZACAO CADASTRAL",
+           "RA/OS CANCELADA", "CODIGO SERVICO ERRADO", "CLIENTE NAO PERMITIU", "IMOVEL NAO LOCALIZADO",
+           "DEBITO PARCELADO", "DUPLICIDADE DE SOLICITACAO", "VAZAMENTO INTERNO", None]
+
+
+def synthetic_export(n_rows, seed=0):
+    """Exportação de RAs com datas, prazos e motivos aleatórios, incluindo datas inválidas, prazos vazios e motivos vazios"""
+    rng = np.random.default_rng(seed)
+    requested = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, n_rows), unit="min")
+    closed = requested + pd.to_timedelta(rng.integers(0, 60 * 24 * 60, n_rows), unit="min")
+    deadline = rng.choice([1, 2, 3, 5, 10, 15, 30, np.nan], n_rows, p=[.1, .15, .2, .2, .15, .1, .09, .01])
+    reasons = rng.choice(np.array(REASONS, dtype=object), n_rows, p=[.6, .1, .08, .06, .05, .03, .02, .02, .01, .01, .01, .01])
+
+    df = pd.DataFrame({
+        "Dt Solicitação RA": requested.astype(object),
+        "Dt Encerramento RA": closed.astype(object),
+        "Prazo Tipo Sol RA": deadline,
+        "Motivo Encer RA": reasons,
+        "Solic Tipo Espec RA": rng.choice(["ALTERACAO DE LOGRADOURO", "RELIGACAO", "VAZAMENTO"], n_rows),
+        "Unidade Abertura RA": rng.choice(["ATENDIMENTO GRAVATA", "ATENDIMENTO BEZERROS", "LOJA DE ATENDIMENTO CARUARU"], n_rows),
+    })
+    df.loc[rng.random(n_rows) < 0.01, "Dt Encerramento RA"] = "SEM DATA"
+    return df
+
+
+def analyze_by_row(df):
+    """Cálculo antigo (apply por linha), usado como referência"""
+    df = df.copy()
+    df["Dt Solicitação RA"] = pd.to_datetime(df["Dt Solicitação RA"], errors="coerce")
+    df["Dt Encerramento RA"] = pd.to_datetime(df["Dt Encerramento RA"], errors="coerce")
+    df["Prazo Tipo Sol RA"] = pd.to_numeric(df["Prazo Tipo Sol RA"], errors="coerce")
+    valid_df = df.dropna(subset=["Dt Solicitação RA", "Dt Encerramento RA", "Prazo Tipo Sol RA"]).copy()
+    valid_df["Dias Decorridos"] = (valid_df["Dt Encerramento RA"] - valid_df["Dt Solicitação RA"]).dt.days
+    valid_df["Situação Prazo"] = valid_df.apply(
+        lambda row: "Dentro do Prazo" if row["Dias Decorridos"] <= row["Prazo Tipo Sol RA"] else "Fora do Prazo", axis=1
+    )
+    within = (valid_df["Situação Prazo"] == "Dentro do Prazo").sum()
+    outside = (valid_df["Situação Prazo"] == "Fora do Prazo").sum()
+    reasons = valid_df[valid_df["Situação Prazo"] == "Fora do Prazo"]["Motivo Encer RA"].value_counts(dropna=False).to_dict()
+    return len(valid_df), within, outside, reasons
+
+
+def analyze_by_column(df):
+    """Cálculo atual, com as mesmas funções de analyze_deadline_with_reason (sem o cache)"""
+    result = summarize_cube(merge_cube_parts([count_by_dimensions(classify_deadlines(df))]))
+    return (result["Quantidade total de atendimentos"], result["Quantidade dentro do prazo"],
+            result["Quantidade fora do prazo"], result["Contagem Motivos Fora do Prazo"])
+
+
+def business_days_by_row(valid_df):
+    """Dias úteis contados dia a dia para cada linha (referência para o modo "uteis")"""
+    holidays = set(holidays_for_years(2023, 2026).astype(object))
+    days = []
+    for start, end in zip(valid_df["Dt Solicitação RA"].dt.date, valid_df["Dt Encerramento RA"].dt.date):
+        count = 0
+        day = start + timedelta(days=1)
+        while day <= end:
+            if day.weekday() < 5 and day not in holidays:
+                count += 1
+            day += timedelta(days=1)
+        days.append(count)
+    return np.array(days)
+
+
+def same_result(old, new):
+    """Compara os resultados; motivos vazios (NaN) são comparados pela posição, já que NaN != NaN"""
+    def normalize(reasons):
+        return [("<vazio>" if pd.isna(reason) else reason, int(count)) for reason, count in reasons.items()]
+    return tuple(map(int, old[:3])) == tuple(map(int, new[:3])) and normalize(old[3]) == normalize(new[3])
+
+
+def main(sizes):
+    print(f"{'linhas':>8} {'linha a linha':>14} {'colunas':>9} {'ganho':>7}  mesmo resultado")
+    for n_rows in sizes:
+        df = synthetic_export(n_rows)
+        start = time.perf_counter()
+        old = analyze_by_row(df)
+        old_time = time.perf_counter() - start
+        start = time.perf_counter()
+        new = analyze_by_column(df)
+        new_time = time.perf_counter() - start
+        print(f"{n_rows:>8} {old_time:>13.3f}s {new_time:>8.3f}s {old_time / new_time:>6.1f}x  {'sim' if same_result(old, new) else 'NÃO'}")
+
+    print(f"\nDias úteis\n{'linhas':>8} {'dia a dia':>14} {'busday':>9} {'ganho':>7}  mesmo resultado")
+    for n_rows in sizes:
+        df = synthetic_export(n_rows)
+        start = time.perf_counter()
+        valid_df = classify_deadlines(df, deadline_mode="uteis")
+        new_time = time.perf_counter() - start
+        start = time.perf_counter()
+        old_days = business_days_by_row(valid_df)
+        old_time = time.perf_counter() - start
+        same = np.array_equal(old_days, valid_df["Dias Decorridos"].to_numpy())
+        print(f"{n_rows:>8} {old_time:>13.3f}s {new_time:>8.3f}s {old_time / new_time:>6.1f}x  {'sim' if same else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 300000])
@@ -0,0 +1,87 @@
+"""
+Compara o pico de memória e o tempo da análise comercial (cubo de atendimentos, sem o cache) lendo a exportação inteira (pd.read_excel) e em blocos
+(openpyxl somente leitura), numa exportação sintética com as 16 colunas da Compesa, e confere que os resultados são iguais.
+Cada leitura roda num processo separado para medir o pico de memória (ru_maxrss, só Linux/macOS).
+
+Uso (na raiz do projeto):
+    python benchmarks/export_ingestion.py
+    python benchmarks/export_ingestion.py 200000
+"""
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_PATH)
+
+from commercial.analysis import build_service_cube, summarize_cube, CHUNK_ROWS
+
+
+HEADER = ["Ano de Solicitação", "Mês de Atendimento", "Solic Tipo Espec RA", "Dt Solicitação RA", "Dt Encerramento RA",
+          "Prazo Tipo Sol RA", "TMA", "Motivo Encer RA", "Unidade Abertura RA", "Unidade Encerramento RA",
+          "User Abertura RA", "User Encerr RA", "Hora Solicitação RA", "Observação RA", "PROTOCOLO", "Parecer Encer RA"]
+
+REASONS = ["CONCLUSAO DO SERVICO", "NAO CONCLUSAO DO SERVICO", "SERVICO JA EXECUTADO", "ATUALIZACAO CADASTRAL",
+           "RA/OS CANCELADA", "CODIGO SERVICO ERRADO", None]
+
+
+def write_synthetic_export(path, n_rows, seed=0):
+    """Grava uma exportação com n_rows RAs (datas, prazos e motivos aleatórios, "-" nas RAs sem encerramento)"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(HEADER)
+    for i in range(n_rows):
+        requested = (start + pd.Timedelta(days=int(rng.integers(0, 365)))).to_pydatetime()
+        closed = "-" if rng.random() < 0.05 else requested + pd.Timedelta(days=int(rng.integers(0, 40))).to_pytimedelta()
+        sheet.append([2024, "jan", "ALTERACAO DE LOGRADOURO", requested, closed, int(rng.choice([1, 3, 5, 10, 30])), 0,
+                      REASONS[int(rng.integers(0, len(REASONS)))], "ATENDIMENTO GRAVATA", "ATENDIMENTO GRAVATA",
+                      "USUARIO ABERTURA", "USUARIO ENCERRAMENTO", requested, "OBSERVACAO DA RA " * 5, f"2024{i:010d}",
+                      "PARECER DE ENCERRAMENTO " * 4])
+    workbook.save(path)
+
+
+def measure(file_name, chunk_rows):
+    """Roda a análise num processo novo e retorna (segundos, pico de memória em MB, resultado)"""
+    code = (f"import sys, json; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+            f"from export_ingestion import run; print(json.dumps(run({file_name!r}, {chunk_rows!r})))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(file_name, chunk_rows):
+    start = time.perf_counter()
+    result = summarize_cube(build_service_cube(file_name, chunk_rows=chunk_rows))
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    reasons = [["<vazio>" if pd.isna(reason) else reason, int(count)] for reason, count in result["Contagem Motivos Fora do Prazo"].items()]
+    summary = [int(result["Quantidade total de atendimentos"]), int(result["Quantidade dentro do prazo"]),
+               int(result["Quantidade fora do prazo"]), reasons]
+    return elapsed, peak_mb, summary
+
+
+def main(sizes):
+    print(f"{'linhas':>8} {'inteira':>9} {'pico':>8} {'em blocos':>10} {'pico':>8}  mesmo resultado")
+    for n_rows in sizes:
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as temp_file:
+            path = temp_file.name
+        try:
+            write_synthetic_export(path, n_rows)
+            full_time, full_mb, full_result = measure(path, None)
+            chunk_time, chunk_mb, chunk_result = measure(path, CHUNK_ROWS)
+            print(f"{n_rows:>8} {full_time:>8.1f}s {full_mb:>6.0f}MB {chunk_time:>9.1f}s {chunk_mb:>6.0f}MB  "
+                  f"{'sim' if full_result == chunk_result else 'NÃO'}")
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [20000, 100000])
@@ -0,0 +1,148 @@
+"""
+Compara o tempo de create_generic_table (montagem direta do XML) com a montagem antiga, célula a célula pelo python-docx,
+para tabelas de não conformidades com cada vez mais linhas. Mostra também o tamanho do XML do corpo do documento
+(a formatação por estilos deixa cada célula bem menor) e confere que as duas tabelas têm os mesmos textos.
+
+Uso (na raiz do projeto):
+    python benchmarks/generic_table.py
+    python benchmarks/generic_table.py 10 100 1000
+"""
+import os
+import sys
+import time
+import pandas as pd
+from docx import Document
+from docx.shared import Pt
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.enum.table import WD_ALIGN_VERTICAL, WD_TABLE_ALIGNMENT
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from common.tables import create_generic_table
+from common.utils import apply_background_color, set_column_widths, set_borders_table, find_paragraphs
+
+
+ANCHOR = "Tabela 6 - Lista de NCs"
+
+
+def set_margin(tag, value, tcMar):
+    """Margem interna antiga de uma célula (em cm, gravada em twips)"""
+    if value is not None:
+        margin = tcMar.find(qn(tag))
+        if margin is None:
+            margin = OxmlElement(tag)
+            tcMar.append(margin)
+        margin.set(qn('w:w'), str(int(value * 567)))
+        margin.set(qn('w:type'), 'dxa')
+
+
+def set_table_margins(cell, top=None, start=None, bottom=None, end=None):
+    """Margens internas antigas, gravadas em cada célula (w:tcMar). top, start, bottom, end -> valores em cm ou None"""
+    tcPr = cell._tc.get_or_add_tcPr()
+    tcMar = tcPr.find(qn('w:tcMar'))
+    if tcMar is None:
+        tcMar = OxmlElement('w:tcMar')
+        tcPr.append(tcMar)
+
+    set_margin('w:top', top, tcMar)
+    set_margin('w:start', start, tcMar)
+    set_margin('w:bottom', bottom, tcMar)
+    set_margin('w:end', end, tcMar)
+
+
+def format_header_cell(cell, text, font_size=10, font_name="Arial", bg_color="D9D9D9"):
+    """Formatação antiga da célula de cabeçalho (fonte, negrito, alinhamento e fundo na própria célula)"""
+    para = cell.paragraphs[0]
+    para.text = ""
+    run = para.add_run(str(text))
+    run.bold = True
+    run.font.size = Pt(font_size)
+    run.font.name = font_name
+    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+    cell._tc.get_or_add_tcPr().append(apply_background_color(bg_color))
+
+
+def format_data_cell(cell, value, font_size=10, font_name="Arial"):
+    """Formatação antiga da célula de dados (fonte e alinhamento na própria célula)"""
+    para = cell.paragraphs[0]
+    para.text = ""
+    run = para.add_run("" if pd.isna(value) else str(value))
+    run.font.size = Pt(font_size)
+    run.font.name = font_name
+    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+
+
+def create_generic_table_by_cell(document, rows_data, text_after_paragraph, col_widths=None,
+                                 cell_padding=0.1, align_left=False, font_size=10):
+    """Montagem antiga do create_generic_table (uma célula por vez pelo python-docx), usada como referência"""
+    n_cols = max(len(row) for row in rows_data)
+    table = document.add_table(rows=0, cols=n_cols)
+    table.alignment = WD_TABLE_ALIGNMENT.CENTER
+
+    for i, row in enumerate(rows_data):
+        row_cells = table.add_row().cells
+        if len(row) == 1 or len(row) < n_cols:
+            merged_cell = row_cells[0]
+            for c in row_cells[1:]:
+                merged_cell = merged_cell.merge(c)
+            format_header_cell(merged_cell, row[0], font_size=font_size)
+            set_table_margins(merged_cell, top=cell_padding, bottom=cell_padding, start=cell_padding, end=cell_padding)
+        elif i == 0:
+            for j, value in enumerate(row):
+                format_header_cell(row_cells[j], value, font_size=font_size)
+                set_table_margins(row_cells[j], top=cell_padding, bottom=cell_padding, start=cell_padding, end=cell_padding)
+        else:
+            for j, value in enumerate(row):
+                format_data_cell(row_cells[j], value, font_size=font_size)
+                set_table_margins(row_cells[j], top=cell_padding, bottom=cell_padding, start=cell_padding, end=cell_padding)
+
+    if align_left:
+        for row in table.rows:
+            for cell in row.cells:
+                for para in cell.paragraphs:
+                    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    set_borders_table(table)
+    if col_widths:
+        set_column_widths(table, *col_widths)
+
+    find_paragraphs(document, text_after_paragraph)[0]._element.addnext(table._element)
+
+
+def nc_rows(n_rows):
+    """Linhas no formato da tabela de não conformidades (cabeçalho, um subtítulo e n_rows linhas de dados)"""
+    rows = [["Unidade", "Não Conformidade", "Nome da Foto", "Artigo", "Enquadramento", "Determinações"], ["SUBTÍTULO"]]
+    for i in range(n_rows):
+        rows.append([f"EEAT - UNIDADE {i}", "Ausência de manutenção, limpeza e conservação", f"Foto {i:02d}",
+                     "Art. 12", "Resolução ARPE nº 200/2022", "Realizar a manutenção da unidade no prazo de 30 dias."])
+    return rows
+
+
+def run(builder, rows):
+    document = Document()
+    document.add_paragraph(ANCHOR)
+    start = time.perf_counter()
+    builder(document, rows, ANCHOR, col_widths=[3, 3, 0.5, 0.3, 3, 3], cell_padding=0.2, align_left=False, font_size=8)
+    elapsed = time.perf_counter() - start
+    texts = [["".join(t.text or "" for t in tc.iter(qn("w:t"))) for tc in tr.iter(qn("w:tc"))]
+             for tr in document.element.body.iter(qn("w:tr"))]
+    return elapsed, len(etree.tostring(document.element.body)) / 1024, texts
+
+
+def main(sizes):
+    print(f"{'linhas':>8} {'célula a célula':>16} {'XML direto':>12} {'ganho':>7} {'XML antes':>10} {'XML depois':>11}  mesmos textos")
+    for n_rows in sizes:
+        rows = nc_rows(n_rows)
+        old_time, old_kb, old_texts = run(create_generic_table_by_cell, rows)
+        new_time, new_kb, new_texts = run(create_generic_table, rows)
+        print(f"{n_rows:>8} {old_time:>15.3f}s {new_time:>11.3f}s {old_time / new_time:>6.1f}x "
+              f"{old_kb:>8.0f}KB {new_kb:>9.0f}KB  {'sim' if old_texts == new_texts else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10, 50, 100, 250, 500, 1000])
@@ -0,0 +1,99 @@
+"""
+Compara a compressão das fotos do relatório (convert_to_valid_jpeg: tentativas na memória com busca binária na qualidade)
+com o laço antigo (qualidade 85, 80, 75... gravando o arquivo e lendo o tamanho a cada tentativa), em fotos sintéticas
+com cada vez mais detalhe e, se existirem, nas fotos de assets/. Os números da versão atual vêm de IMAGE_STATS
+(compressões feitas e bytes da foto original e da processada) e as duas versões devem gravar exatamente o mesmo arquivo.
+
+Uso (na raiz do projeto):
+    python benchmarks/image_encoding.py
+    python benchmarks/image_encoding.py 20
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image, ImageOps
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from common.images import convert_to_valid_jpeg, resize_to_cell, list_images, IMAGE_STATS, JPEG_QUALITIES
+from common.paths import ASSETS_PATH
+
+
+def write_synthetic_photos(folder, count, seed=0):
+    """
+    Grava count fotos 2000x1500 (gradiente + ruído em blocos de 4 px, que sobrevive à redução para a célula,
+    do mais liso ao mais detalhado) e retorna os caminhos
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, 2000)[None, :, None] * np.ones((1500, 1, 3))
+    paths = []
+    for i in range(count):
+        noise = rng.normal(0, 2 + 100 * i / max(count - 1, 1), (375, 500, 3)).repeat(4, axis=0).repeat(4, axis=1)
+        pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(folder, f"foto_{i:03d}.jpg")
+        Image.fromarray(pixels).save(path, "JPEG", quality=95)
+        paths.append(path)
+    return paths
+
+
+def old_convert(image_path, new_path, target_size_kb=(20, 50)):
+    """Laço antigo: grava a foto em cada qualidade, da maior para a menor, até caber. Retorna a quantidade de compressões"""
+    with Image.open(image_path) as img:
+        img = resize_to_cell(ImageOps.exif_transpose(img.convert("RGB")))
+        encodes = 0
+        for quality in JPEG_QUALITIES:
+            img.save(new_path, "JPEG", quality=quality, optimize=True)
+            encodes += 1
+            if os.path.getsize(new_path) / 1024 <= target_size_kb[1]:
+                break
+        return encodes
+
+
+def compare(image_paths, folder):
+    """Roda as duas versões em cada foto e retorna (tempo antigo, tempo atual, compressões antigas, atuais, bytes originais, finais, iguais)"""
+    IMAGE_STATS.clear()
+    old_time = new_time = 0
+    old_encodes = 0
+    same = True
+    for i, image_path in enumerate(image_paths):
+        old_path = os.path.join(folder, f"antiga_{i}.jpg")
+        new_path = os.path.join(folder, f"atual_{i}.jpg")
+
+        start = time.perf_counter()
+        old_encodes += old_convert(image_path, old_path)
+        old_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        convert_to_valid_jpeg(image_path, new_path)
+        new_time += time.perf_counter() - start
+
+        with open(old_path, "rb") as old_file, open(new_path, "rb") as new_file:
+            same = same and old_file.read() == new_file.read()
+
+    stats = [IMAGE_STATS[image_path] for image_path in image_paths]
+    return (old_time, new_time, old_encodes, sum(stat["encodes"] for stat in stats),
+            sum(stat["source_bytes"] for stat in stats), sum(stat["final_bytes"] for stat in stats), same)
+
+
+def main(count):
+    folder = tempfile.mkdtemp()
+    try:
+        photo_sets = [("sintéticas", write_synthetic_photos(folder, count))]
+        asset_photos = list_images(ASSETS_PATH) if os.path.isdir(ASSETS_PATH) else []
+        if asset_photos:
+            photo_sets.append(("assets/", asset_photos))
+
+        print(f"{'fotos':>14} {'antigo':>8} {'atual':>8} {'compressões':>12} {'original':>10} {'final':>8}  mesmo arquivo")
+        for name, image_paths in photo_sets:
+            old_time, new_time, old_encodes, new_encodes, source_bytes, final_bytes, same = compare(image_paths, folder)
+            print(f"{len(image_paths):>4} {name:<9} {old_time:>7.2f}s {new_time:>7.2f}s {old_encodes:>5} -> {new_encodes:<4} "
+                  f"{source_bytes / 1024:>8.0f}KB {final_bytes / 1024:>6.0f}KB  {'sim' if same else 'NÃO'}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 12)
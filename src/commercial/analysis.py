@@ -1,33 +1,231 @@
 import pandas as pd
+import numpy as np
 import os
-from common.paths import DATA_PATH
+import warnings
+from openpyxl import load_workbook
+from common.paths import DATA_PATH, CACHE_PATH
+from common.utils import sanitize_value
+from common.cache import get_file_key, options_digest, load_cached_frame, save_cached_frame
+from commercial.holidays import count_business_days, EXTRA_HOLIDAYS
 
-def analyze_deadline_with_reason(sheet_name="Sheet1", file_name="Dados Compesa (Comercial).xlsx"):
-    file_path = os.path.join(DATA_PATH, file_name)
-    
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
 
-    df["Dt Solicitação RA"] = pd.to_datetime(df["Dt Solicitação RA"], errors="coerce")
-    df["Dt Encerramento RA"] = pd.to_datetime(df["Dt Encerramento RA"], errors="coerce")
+# Valores da coluna "Situação Prazo" (categorias, na ordem dos códigos 0 e 1)
+DEADLINE_SITUATIONS = ["Dentro do Prazo", "Fora do Prazo"]
+
+# Colunas da exportação da Compesa usadas na análise de prazos (as outras não são lidas)
+ANALYSIS_COLUMNS = ["Dt Solicitação RA", "Dt Encerramento RA", "Prazo Tipo Sol RA", "Motivo Encer RA", "Solic Tipo Espec RA",
+                    "Unidade Abertura RA"]
+
+# Coluna da exportação com a loja de atendimento onde a RA foi aberta (ex: "ATENDIMENTO GRAVATA")
+STORE_COLUMN = "Unidade Abertura RA"
+
+# Colunas que podem faltar na exportação (ex: exportações de uma loja só, sem a unidade): são lidas como vazias
+# e só servem para separar o cubo, sem entrar no cálculo do prazo
+OPTIONAL_COLUMNS = [STORE_COLUMN, "Solic Tipo Espec RA"]
+
+# Prefixos retirados do nome da loja (já sem acentos e em minúsculo) para chegar ao município
+STORE_PREFIXES = ["loja de atendimento ", "atendimento "]
+
+# Dimensões do cubo de atendimentos (ver build_service_cube); "Mês" é o mês da solicitação, como AAAA-MM
+CUBE_DIMENSIONS = [STORE_COLUMN, "Mês", "Solic Tipo Espec RA", "Situação Prazo", "Motivo Encer RA"]
+
+# Versão do cálculo do cubo: mudar invalida os cubos já gravados em cache
+CUBE_VERSION = 2
+
+COMMERCIAL_CACHE_PATH = os.path.join(CACHE_PATH, "comercial")
+
+# Cubos já carregados neste processo, pelo caminho no cache
+cubes = {}
+
+# Como contar os dias até o encerramento, para comparar com "Prazo Tipo Sol RA":
+# "corridos" (dias do calendário) ou "uteis" (segunda a sexta, sem feriados nacionais e de Pernambuco, ver commercial.holidays)
+DEADLINE_MODE = "corridos"
+
+# Linhas lidas por vez da exportação; None lê a planilha inteira de uma vez com pd.read_excel.
+# O pico de memória da análise é praticamente o de um bloco; o tempo é o da leitura do XML e quase não muda com o tamanho do bloco
+CHUNK_ROWS = 10000
+
+
+def check_export_columns(header, columns, optional_columns):
+    """Erro se faltar na exportação alguma coluna obrigatória (as de optional_columns podem faltar)"""
+    missing = [column for column in columns if column not in header and column not in optional_columns]
+    if missing:
+        raise ValueError(f"Colunas não encontradas na exportação: {', '.join(missing)}")
+
+
+def iter_export_chunks(file_path, sheet_name="Sheet1", columns=ANALYSIS_COLUMNS, chunk_rows=CHUNK_ROWS, optional_columns=OPTIONAL_COLUMNS):
+    """
+    Lê a exportação em blocos de chunk_rows linhas (DataFrames só com as colunas informadas), sem carregar a planilha
+    inteira na memória: o openpyxl em modo somente leitura percorre as linhas do XML da aba uma a uma.
+    Com chunk_rows=None retorna um único bloco lido pelo pd.read_excel.
+    As colunas de optional_columns que não existem na exportação vêm preenchidas com None.
+    Obs: a memória do próprio openpyxl ainda cresce um pouco com o tamanho da exportação (ele carrega a tabela de textos
+    compartilhados, sharedStrings.xml, inteira ao abrir a planilha, e a leitura das linhas sozinha também cresce devagar,
+    uns 8 MB a cada 100 mil linhas na exportação sintética de benchmarks/export_ingestion.py); o resto fica no tamanho de um bloco.
+    """
+    if chunk_rows is None:
+        df = pd.read_excel(file_path, sheet_name=sheet_name, usecols=lambda column: column in columns)
+        check_export_columns(list(df.columns), columns, optional_columns)
+        yield df.reindex(columns=columns).astype({column: object for column in columns if column not in df.columns})
+        return
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        check_export_columns(header, columns, optional_columns)
+        positions = [header.index(column) if column in header else None for column in columns]
+
+        chunk = []
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            chunk.append([row[position] if position is not None and position < len(row) else None for position in positions])
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def parse_dates(values):
+    """
+    pd.to_datetime com errors="coerce". Um bloco da exportação pode ter só textos que não são datas (ex: "-" na data de
+    encerramento das RAs abertas); eles viram NaT como antes, sem o aviso do pandas de formato não identificado.
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Could not infer format", category=UserWarning)
+        return pd.to_datetime(values, errors="coerce")
+
+
+def classify_deadlines(df, deadline_mode=None):
+    """
+    Recebe a exportação de RAs e retorna só as linhas com datas e prazo válidos, com as colunas
+    "Dias Decorridos" e "Situação Prazo" (categórica: Dentro do Prazo / Fora do Prazo), calculadas coluna a coluna.
+    "Motivo Encer RA" também vira categórica (poucos motivos diferentes repetidos em muitas linhas).
+    deadline_mode: "corridos" ou "uteis" (padrão DEADLINE_MODE)
+    """
+    deadline_mode = deadline_mode or DEADLINE_MODE
+    df = df.copy()
+    df["Dt Solicitação RA"] = parse_dates(df["Dt Solicitação RA"])
+    df["Dt Encerramento RA"] = parse_dates(df["Dt Encerramento RA"])
     df["Prazo Tipo Sol RA"] = pd.to_numeric(df["Prazo Tipo Sol RA"], errors="coerce")
 
     valid_df = df.dropna(subset=["Dt Solicitação RA", "Dt Encerramento RA", "Prazo Tipo Sol RA"]).copy()
 
-    valid_df["Dias Decorridos"] = (valid_df["Dt Encerramento RA"] - valid_df["Dt Solicitação RA"]).dt.days
+    if deadline_mode == "uteis":
+        valid_df["Dias Decorridos"] = count_business_days(valid_df["Dt Solicitação RA"].to_numpy(),
+                                                          valid_df["Dt Encerramento RA"].to_numpy())
+    elif deadline_mode == "corridos":
+        valid_df["Dias Decorridos"] = (valid_df["Dt Encerramento RA"] - valid_df["Dt Solicitação RA"]).dt.days
+    else:
+        raise ValueError(f"Modo de prazo inválido: {deadline_mode} (use 'corridos' ou 'uteis')")
+
+    outside = valid_df["Dias Decorridos"].to_numpy() > valid_df["Prazo Tipo Sol RA"].to_numpy()
+    valid_df["Situação Prazo"] = pd.Categorical.from_codes(outside.astype(np.int8), categories=DEADLINE_SITUATIONS)
+    valid_df["Motivo Encer RA"] = valid_df["Motivo Encer RA"].astype("category")
+    return valid_df
 
-    valid_df["Situação Prazo"] = valid_df.apply(
-        lambda row: "Dentro do Prazo" if row["Dias Decorridos"] <= row["Prazo Tipo Sol RA"] else "Fora do Prazo", axis=1
-    )
 
+def count_by_dimensions(valid_df):
+    """
+    Cubo parcial de um bloco já classificado (classify_deadlines): quantidade de RAs por loja, mês da solicitação (AAAAMM),
+    tipo de solicitação, situação do prazo e motivo de encerramento, na ordem em que cada combinação aparece
+    """
+    requested = valid_df["Dt Solicitação RA"].dt
+    keys = pd.DataFrame({
+        STORE_COLUMN: valid_df[STORE_COLUMN].astype("category"),
+        "Mês": requested.year * 100 + requested.month,
+        "Solic Tipo Espec RA": valid_df["Solic Tipo Espec RA"].astype("category"),
+        "Situação Prazo": valid_df["Situação Prazo"],
+        "Motivo Encer RA": valid_df["Motivo Encer RA"],
+    })
+    counts = keys.groupby(CUBE_DIMENSIONS, sort=False, dropna=False, observed=True).size().rename("Quantidade").reset_index()
+    return counts.astype({dimension: object for dimension in CUBE_DIMENSIONS if dimension != "Mês"})
 
-    total_valid_rows = len(valid_df)
-    within_deadline = (valid_df["Situação Prazo"] == "Dentro do Prazo").sum()
-    outside_deadline = (valid_df["Situação Prazo"] == "Fora do Prazo").sum()
+
+def sum_cube_parts(parts):
+    """Soma cubos parciais (ainda com o mês como AAAAMM), mantendo a ordem em que as combinações apareceram"""
+    return pd.concat(parts, ignore_index=True).groupby(CUBE_DIMENSIONS, sort=False, dropna=False)["Quantidade"].sum().reset_index()
+
+
+def merge_cube_parts(parts):
+    """Soma os cubos parciais dos blocos (mantendo a ordem em que as combinações apareceram) e formata o mês como AAAA-MM"""
+    if not parts:
+        return pd.DataFrame({dimension: pd.Series(dtype=object) for dimension in CUBE_DIMENSIONS} | {"Quantidade": pd.Series(dtype="int64")})
+
+    cube = sum_cube_parts(parts)
+    month = cube["Mês"].astype("int64")
+    cube["Mês"] = (month // 100).astype(str) + "-" + (month % 100).astype(str).str.zfill(2)
+    return cube
+
+
+def build_service_cube(file_path, sheet_name="Sheet1", chunk_rows=CHUNK_ROWS, deadline_mode=None):
+    """
+    Lê a exportação uma única vez, em blocos (ver iter_export_chunks), e monta o cubo de atendimentos:
+    uma linha por combinação de CUBE_DIMENSIONS com a quantidade de RAs. O cubo tem poucas linhas mesmo para exportações grandes.
+    O cubo de cada bloco é somado ao acumulado assim que é calculado, sem guardar os cubos de todos os blocos.
+    """
+    cube = None
+    for chunk in iter_export_chunks(file_path, sheet_name, ANALYSIS_COLUMNS, chunk_rows):
+        part = count_by_dimensions(classify_deadlines(chunk, deadline_mode))
+        cube = part if cube is None else sum_cube_parts([cube, part])
+    return merge_cube_parts([] if cube is None else [cube])
+
+
+def get_service_cube(sheet_name="Sheet1", file_name="Dados Compesa (Comercial).xlsx", chunk_rows=CHUNK_ROWS, deadline_mode=None):
+    """
+    Retorna o cubo de atendimentos da exportação. Ele é montado uma vez e guardado em memória e em
+    data/.cache/comercial/<hash da exportação>/, então só é recalculado quando o arquivo, a aba ou o modo de prazo mudam.
+    """
+    file_path = os.path.join(DATA_PATH, file_name)
+    deadline_mode = deadline_mode or DEADLINE_MODE
+    options = {"sheet_name": sheet_name, "deadline_mode": deadline_mode, "version": CUBE_VERSION}
+    if deadline_mode == "uteis":
+        options["extra_holidays"] = tuple(EXTRA_HOLIDAYS)
+    file_key = get_file_key(file_path, COMMERCIAL_CACHE_PATH)
+    cache_path = os.path.join(COMMERCIAL_CACHE_PATH, file_key[:16], f"cubo-{options_digest(options)}.pkl")
+
+    cube = cubes.get(cache_path)
+    if cube is None:
+        cube = load_cached_frame(cache_path)
+    if cube is None:
+        cube = build_service_cube(file_path, sheet_name, chunk_rows, deadline_mode)
+        save_cached_frame(cube, cache_path)
+    cubes[cache_path] = cube
+    return cube
+
+
+def cube_breakdown(cube, dimension):
+    """
+    Quantidade de atendimentos dentro e fora do prazo e o total para cada valor de uma dimensão do cubo
+    (ex: "Mês", "Solic Tipo Espec RA", "Motivo Encer RA"), em ordem crescente do valor, sem ler a exportação de novo.
+    Valores vazios (ex: exportação sem a coluna, ver OPTIONAL_COLUMNS) ficam numa linha própria, no final.
+    """
+    counts = cube.groupby([dimension, "Situação Prazo"], dropna=False)["Quantidade"].sum()
+    table = counts.unstack("Situação Prazo", fill_value=0).reindex(columns=DEADLINE_SITUATIONS, fill_value=0)
+    table.columns.name = None
+    table["Total"] = table.sum(axis=1)
+    return table.astype("int64")
+
+
+def summarize_cube(cube):
+    """
+    Totais usados nas tabelas e placeholders do relatório comercial, a partir do cubo: atendimentos dentro e fora do prazo,
+    a contagem dos motivos fora do prazo (maior primeiro e, no empate, na ordem em que apareceram, como o value_counts)
+    e os atendimentos dentro e fora do prazo por mês da solicitação e por tipo de solicitação (ver cube_breakdown)
+    """
+    outside = cube["Situação Prazo"] == "Fora do Prazo"
+    total_valid_rows = int(cube["Quantidade"].sum())
+    outside_deadline = int(cube.loc[outside, "Quantidade"].sum())
+    within_deadline = total_valid_rows - outside_deadline
 
     pct_within = (within_deadline / total_valid_rows * 100) if total_valid_rows else 0
     pct_outside = (outside_deadline / total_valid_rows * 100) if total_valid_rows else 0
 
-    reasons_counts = valid_df[valid_df["Situação Prazo"] == "Fora do Prazo"]["Motivo Encer RA"].value_counts(dropna=False).to_dict()
+    reasons = cube[outside].groupby("Motivo Encer RA", sort=False, dropna=False)["Quantidade"].sum()
 
     return {
         "Quantidade total de atendimentos": total_valid_rows,
@@ -35,5 +233,62 @@ def analyze_deadline_with_reason(sheet_name="Sheet1", file_name="Dados Compesa (
         "Quantidade fora do prazo": outside_deadline,
         "% dentro do prazo": round(pct_within, 2),
         "% fora do prazo": round(pct_outside, 2),
-        "Contagem Motivos Fora do Prazo": reasons_counts
-    }
\ No newline at end of file
+        "Contagem Motivos Fora do Prazo": reasons.sort_values(ascending=False).to_dict(),
+        "Atendimentos por Mês": cube_breakdown(cube, "Mês"),
+        "Atendimentos por Tipo de Solicitação": cube_breakdown(cube, "Solic Tipo Espec RA"),
+    }
+
+
+def store_municipality(unit):
+    """
+    Município de uma loja da exportação, sem acentos e em minúsculo (ex: "ATENDIMENTO GRAVATA" -> "gravata").
+    RAs sem loja (ou uma exportação sem a coluna STORE_COLUMN) ficam com "".
+    """
+    if pd.isna(unit):
+        return ""
+    name = sanitize_value(unit)
+    for prefix in STORE_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):].strip()
+    return name
+
+
+def analyze_stores(sheet_name="Sheet1", file_name="Dados Compesa (Comercial).xlsx", chunk_rows=CHUNK_ROWS, deadline_mode=None):
+    """
+    Resultado da análise de prazos de cada loja da exportação (chave: município da loja, ver store_municipality),
+    com a exportação lida uma vez só e um único group-by do cubo separando todas as lojas
+    """
+    cube = get_service_cube(sheet_name, file_name, chunk_rows, deadline_mode)
+    units = cube[STORE_COLUMN].fillna("")
+    municipalities = {unit: store_municipality(unit) for unit in units.unique()}
+    stores = units.map(municipalities)
+    return {store: summarize_cube(part) for store, part in cube.groupby(stores, sort=False, dropna=False)}
+
+
+def analyze_deadline_with_reason(sheet_name="Sheet1", file_name="Dados Compesa (Comercial).xlsx", chunk_rows=CHUNK_ROWS,
+                                 deadline_mode=None, municipality=None):
+    """
+    Calcula, pela exportação de RAs da Compesa, quantos atendimentos foram encerrados dentro e fora do prazo
+    e os motivos de encerramento dos que ficaram fora do prazo. Tudo sai do cubo de atendimentos (ver get_service_cube),
+    que é montado numa única leitura da exportação em blocos.
+    deadline_mode: "corridos" ou "uteis" (padrão DEADLINE_MODE), ver classify_deadlines
+    municipality: município da fiscalização. A exportação pode ter várias lojas (coluna STORE_COLUMN): só as RAs da loja
+    do município são usadas. Sem município, ou com uma exportação de uma única loja (ou sem a coluna da loja), usa a
+    exportação inteira, avisando se a loja for de outro município.
+    """
+    if municipality is None:
+        return summarize_cube(get_service_cube(sheet_name, file_name, chunk_rows, deadline_mode))
+
+    stores = analyze_stores(sheet_name, file_name, chunk_rows, deadline_mode)
+    store = sanitize_value(municipality)
+    if len(stores) <= 1:
+        only_store = next(iter(stores), "")
+        if only_store not in ("", store):
+            print(f"⚠️ A exportação {file_name} só tem RAs da loja de '{only_store}', e não de '{municipality}': "
+                  f"os dados dessa loja serão usados no relatório")
+        return next(iter(stores.values()), summarize_cube(get_service_cube(sheet_name, file_name, chunk_rows, deadline_mode)))
+
+    if store not in stores:
+        raise ValueError(f"Nenhuma loja do município '{municipality}' na exportação {file_name} "
+                         f"(lojas: {', '.join(sorted(str(name) for name in stores))})")
+    return stores[store]
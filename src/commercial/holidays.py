@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+import numpy as np
+
+
+# Feriados nacionais de data fixa (mês, dia)
+NATIONAL_HOLIDAYS = [(1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25)]
+
+# Dia Nacional de Zumbi e da Consciência Negra (20/11), feriado nacional a partir de 2024
+BLACK_CONSCIOUSNESS_DAY_SINCE = 2024
+
+# Feriados estaduais de Pernambuco: Data Magna (06/03) e São João (24/06)
+PERNAMBUCO_HOLIDAYS = [(3, 6), (6, 24)]
+
+# Outros dias sem expediente a considerar (feriados municipais, pontos facultativos etc), como "AAAA-MM-DD"
+EXTRA_HOLIDAYS = []
+
+
+def easter_sunday(year):
+    """Domingo de Páscoa do ano (calendário gregoriano, algoritmo de Meeus/Jones/Butcher)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def holidays_for_years(first_year, last_year, extra_holidays=None):
+    """
+    Feriados (nacionais, de Pernambuco e os extras) de first_year a last_year, como datetime64[D] ordenado,
+    no formato usado por np.busday_count. A Sexta-feira Santa é calculada pela Páscoa de cada ano.
+    """
+    extra_holidays = EXTRA_HOLIDAYS if extra_holidays is None else extra_holidays
+    days = set()
+    for year in range(first_year, last_year + 1):
+        for month, day in NATIONAL_HOLIDAYS + PERNAMBUCO_HOLIDAYS:
+            days.add(date(year, month, day))
+        if year >= BLACK_CONSCIOUSNESS_DAY_SINCE:
+            days.add(date(year, 11, 20))
+        days.add(easter_sunday(year) - timedelta(days=2))
+    days.update(date.fromisoformat(day) for day in extra_holidays)
+    return np.array(sorted(days), dtype="datetime64[D]")
+
+
+def count_business_days(start_dates, end_dates, extra_holidays=None):
+    """
+    Dias úteis entre as datas de início e fim (arrays datetime64), de uma vez para todas as linhas:
+    segunda a sexta, sem os feriados, contando o dia do fim e não o do início
+    (igual aos dias corridos: solicitado na segunda e encerrado na terça conta 1 dia).
+    """
+    start_days = start_dates.astype("datetime64[D]")
+    end_days = end_dates.astype("datetime64[D]")
+    if not len(start_days):
+        return np.zeros(0, dtype=np.int64)
+
+    years = np.concatenate([start_days, end_days]).astype("datetime64[Y]").astype(int) + 1970
+    holidays = holidays_for_years(int(years.min()), int(years.max()), extra_holidays)
+    calendar = np.busdaycalendar(weekmask="1111100", holidays=holidays)
+    return np.busday_count(start_days + 1, end_days + 1, busdaycal=calendar)
@@ -1,8 +1,4 @@
 from common.tables import create_generic_table
-from common.paths import SHEET_PATH
-import pandas as pd
-
-spreadsheet = pd.ExcelFile(SHEET_PATH)
 
 def create_quantity_service_table(document, analysis_result, text="Tabela 2 - Quantidade de atendimentos"):
     """Cria a tabela 2, descrevendo quantos atendimentos houveram naquela loja e quantos (%) foram fora do prazo e no prazo"""
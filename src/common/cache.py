@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Retorna o hash sha256 do conteúdo de um arquivo, lendo em blocos"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def options_digest(options):
+    """Retorna um hash curto de um dicionário de parâmetros (ex: parâmetros de leitura de uma aba)"""
+    return hashlib.sha1(repr(sorted(options.items())).encode("utf-8")).hexdigest()[:10]
+
+
+def get_file_key(path, cache_dir):
+    """
+    Retorna a chave de cache do conteúdo atual de um arquivo (sha256).
+    O hash só é recalculado quando a data de modificação ou o tamanho mudam; se o conteúdo mudou,
+    as entradas antigas do cache_dir são apagadas.
+    """
+    stat = os.stat(path)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    meta = {}
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            meta = {}
+
+    if meta.get("mtime_ns") == stat.st_mtime_ns and meta.get("size") == stat.st_size:
+        return meta["sha256"]
+
+    digest = file_digest(path)
+    if meta.get("sha256") and meta["sha256"] != digest:
+        shutil.rmtree(os.path.join(cache_dir, meta["sha256"][:16]), ignore_errors=True)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_atomic(meta_path, json.dumps({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}).encode("utf-8"))
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o cache em {cache_dir}: {e}")
+    return digest
+
+
+def write_atomic(path, data):
+    """Grava bytes em um arquivo temporário e só então substitui o destino (nunca deixa arquivo pela metade)"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+
+def load_cached_frame(path):
+    """Lê um DataFrame do cache. Retorna None se não existir ou estiver corrompido"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_pickle(path)
+    except Exception:
+        return None
+
+
+def save_cached_frame(df, path):
+    """Grava um DataFrame no cache (formato binário do pandas, por colunas)"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_pickle(temp_path)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o cache em {path}: {e}")
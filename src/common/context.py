@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+import pandas as pd
+from common.excel import get_inspections_data, get_non_conformities
+from common.paths import get_assets_path
+
+
+@dataclass(frozen=True)
+class ReportContext:
+    """
+    Dados de uma fiscalização, calculados uma única vez e repassados para todas as etapas do relatório.
+    report_id: id da fiscalização
+    data: dados da linha da aba "Fiscalizações" (já com os campos calculados, ex: "Total NCS Atual (palavra)")
+    non_conformities: não conformidades da fiscalização (não alterar, usar .copy() se precisar)
+    assets_path: pasta com as fotos da fiscalização (assets/<ID> ou assets/)
+    """
+    report_id: int
+    data: MappingProxyType
+    non_conformities: pd.DataFrame
+    assets_path: str
+
+    @property
+    def inspection_type(self):
+        """Tipo da fiscalização já normalizado ("agua", "esgoto" ou "comercial")"""
+        return self.data["Tipo da Fiscalização"]
+
+
+def build_report_context(report_id):
+    """Lê da planilha os dados da fiscalização informada e monta o contexto do relatório"""
+    non_conformities = get_non_conformities(report_id)
+    data = get_inspections_data(report_id, non_conformities)
+    if data is None:
+        return None
+    return ReportContext(report_id=report_id, data=MappingProxyType(data), non_conformities=non_conformities,
+                         assets_path=get_assets_path(report_id))
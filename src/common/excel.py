@@ -1,40 +1,242 @@
 import pandas as pd
+import numpy as np
 import os
 from unidecode import unidecode
 from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
 from num2words import num2words
-from common.paths import SHEET_PATH
+from common.paths import SHEET_PATH, CACHE_PATH
+from common.cache import get_file_key, file_digest, options_digest, load_cached_frame, save_cached_frame
+from common.xlsx import update_column_by_key
 
 
-spreadsheet = pd.ExcelFile(SHEET_PATH)
+# Tabelas lidas da planilha: nome -> aba, linha do cabeçalho (a partir de 0), quantidade de linhas e colunas usadas.
+# Sem "nrows" lê até a última linha preenchida; sem "usecols" lê todas as colunas (colunas que não existirem são ignoradas)
+SHEETS = {
+    "inspections": {"sheet_name": "Fiscalizações"},
+    "non_conformities": {
+        "sheet_name": "Nao-conformidades", "header": 5,
+        "usecols": ["ID da Fiscalização", "Unidade", "Não Conformidade", "Artigo", "Enquadramento", "Determinações", "Nome da Foto"],
+    },
+    "documents_water": {"sheet_name": "Envio de Documentos", "header": 1, "nrows": 11},
+    "documents_sewage": {"sheet_name": "Envio de Documentos", "header": 15},
+    # Aba pequena: lida inteira, porque create_quality_index_table normaliza os cabeçalhos (espaços, " (%)") antes de escolher as colunas
+    "town_statistics": {"sheet_name": "Estatisticas "},
+    "units": {"sheet_name": "Cadastrar Unidades", "header": 3, "usecols": ["Municipio", "Sistema", "Tipo", "Unidade", "Observação"]},
+}
 
-inspections = pd.read_excel(spreadsheet, sheet_name="Fiscalizações")
-non_conformities = pd.read_excel(spreadsheet, sheet_name="Nao-conformidades", header=5)
-documents_excel = pd.read_excel(spreadsheet, sheet_name="Envio de Documentos")
-town_statistics = pd.read_excel(spreadsheet, sheet_name="Estatisticas ")
-units_df = pd.read_excel(spreadsheet, sheet_name="Cadastrar Unidades", header=3)
+# Tabelas usadas por cada tipo de relatório (um relatório comercial não precisa de estatísticas nem unidades)
+REPORT_SHEETS = {
+    "agua": ["inspections", "non_conformities", "documents_water", "town_statistics", "units"],
+    "esgoto": ["inspections", "non_conformities", "documents_sewage", "town_statistics", "units"],
+    "comercial": ["inspections", "non_conformities"],
+}
 
+SHEETS_CACHE_PATH = os.path.join(CACHE_PATH, "planilha")
 
-def get_this_report():
-    """Retorna o id referente a fiscalização atual baseado em qual linha estiver escrito [Gerar]"""
+workbook = None
+workbook_key = None
+sheets = {}
+
+
+def get_workbook():
+    """Abre a planilha uma única vez, em modo somente leitura (streaming). Todas as leituras de abas usam esse mesmo handle"""
+    global workbook
+    if workbook is None:
+        workbook = load_workbook(SHEET_PATH, read_only=True, data_only=True, keep_links=False)
+    return workbook
+
+
+def close_workbook():
+    """Fecha o handle da planilha (antes de gravar nela). Abas já lidas continuam em memória"""
+    global workbook, workbook_key
+    if workbook is not None:
+        workbook.close()
+        workbook = None
+    workbook_key = None
+
+
+def get_workbook_key():
+    """Retorna o hash do conteúdo atual da planilha, usado como chave do cache das abas"""
+    global workbook_key
+    if workbook_key is None:
+        workbook_key = get_file_key(SHEET_PATH, SHEETS_CACHE_PATH)
+    return workbook_key
+
+
+def get_sheet_cache_path(name):
+    """Caminho do cache de uma tabela: data/.cache/planilha/<hash da planilha>/<tabela>-<hash dos parâmetros>.pkl"""
+    return os.path.join(SHEETS_CACHE_PATH, get_workbook_key()[:16], f"{name}-{options_digest(SHEETS[name])}.pkl")
+
+
+def convert_cell(value):
+    """Converte o valor de uma célula do mesmo jeito que o pd.read_excel (vazia -> "", erro -> NaN, 3.0 -> 3)"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        int_value = int(value)
+        return int_value if int_value == value else value
+    if isinstance(value, str) and value in ERROR_CODES:
+        return np.nan
+    return value
+
+
+def rows_needed(options):
+    """Quantidade de linhas da aba que a tabela precisa (None = até o final)"""
+    if options.get("nrows") is None:
+        return None
+    return options.get("header", 0) + 1 + options["nrows"]
+
+
+def parse_table(rows, options):
+    """Monta o DataFrame de uma tabela a partir das linhas já lidas da aba, com as mesmas regras do pd.read_excel"""
+    data = []
+    last_row_with_data = -1
+    for row in rows[:rows_needed(options)]:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        if row:
+            last_row_with_data = len(data)
+        data.append(row)
+    data = data[:last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame()
+
+    max_width = max(len(row) for row in data)
+    data = [row + [""] * (max_width - len(row)) for row in data]
+
+    header = options.get("header", 0)
+    usecols = options.get("usecols")
+    if usecols is not None and header < len(data):
+        usecols = [col for col in usecols if col in data[header]]
+
+    parser = TextParser(data, header=header, nrows=options.get("nrows"), usecols=usecols, skip_blank_lines=False)
+    return parser.read(nrows=options.get("nrows"))
+
+
+def read_tables(names):
+    """
+    Lê da planilha as tabelas informadas (nomes de SHEETS) em uma única passada.
+    Cada aba é percorrida uma vez só, mesmo que tenha mais de uma tabela (ex: documentos de água e de esgoto),
+    e apenas até a última linha que alguma das tabelas precisa.
+    """
+    tables_by_sheet = {}
+    for name in names:
+        tables_by_sheet.setdefault(SHEETS[name]["sheet_name"], []).append(name)
+
+    tables = {}
+    for sheet_name, sheet_tables in tables_by_sheet.items():
+        needed = [rows_needed(SHEETS[name]) for name in sheet_tables]
+        max_row = None if None in needed else max(needed)
+
+        ws = get_workbook()[sheet_name]
+        ws.reset_dimensions()
+        rows = [[convert_cell(value) for value in row] for row in ws.iter_rows(max_row=max_row, values_only=True)]
+
+        for name in sheet_tables:
+            tables[name] = parse_table(rows, SHEETS[name])
+    return tables
+
+
+def load_sheets(names):
+    """
+    Carrega as tabelas informadas: as que já estão em memória ou no cache (data/.cache) não são lidas de novo,
+    e todas as que faltarem são lidas do .xlsm juntas em uma única passada.
+    """
+    missing = []
+    for name in names:
+        if name in sheets:
+            continue
+        df = load_cached_frame(get_sheet_cache_path(name))
+        if df is None:
+            missing.append(name)
+        else:
+            sheets[name] = df
+
+    if missing:
+        for name, df in read_tables(missing).items():
+            save_cached_frame(df, get_sheet_cache_path(name))
+            sheets[name] = df
+    return {name: sheets[name] for name in names}
+
+
+def get_sheet(name):
+    """
+    Retorna a tabela da planilha (ex: "inspections", "units"). A aba só é lida no primeiro acesso.
+    Se a planilha não mudou desde a última execução, a tabela vem do cache em data/.cache em vez de ser lida do .xlsm
+    """
+    if name not in sheets:
+        load_sheets([name])
+    return sheets[name]
+
+
+def get_snapshot(names=None):
+    """
+    Retorna as tabelas informadas (lendo as que faltarem), para enviar aos processos do modo paralelo.
+    names: lista de tabelas de SHEETS. Se não for passada, inclui todas.
+    """
+    if names is None:
+        names = list(SHEETS)
+    return load_sheets(names)
+
+
+def load_snapshot(snapshot):
+    """Carrega no processo atual os dados vindos de get_snapshot, sem reabrir a planilha"""
+    sheets.update(snapshot)
+
+
+def normalize_report_type(value):
+    """Normaliza o tipo da fiscalização (ex: "Água" -> "agua")"""
+    return unidecode(str(value).strip().lower()).replace(" ", "")
+
+
+def get_report_types(report_ids):
+    """Retorna os tipos (já normalizados, ex: "agua", "comercial") das fiscalizações informadas, sem repetição"""
+    inspections = get_sheet("inspections")
+    report_types = inspections[inspections["ID da Fiscalização"].isin(report_ids)]["Tipo da Fiscalização"]
+    return list(report_types.map(normalize_report_type).unique())
+
+
+def get_required_sheets(report_ids):
+    """Retorna as tabelas necessárias para gerar os relatórios informados, de acordo com o tipo de cada fiscalização"""
+    names = []
+    for report_type in get_report_types(report_ids):
+        for name in REPORT_SHEETS.get(report_type, SHEETS):
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def get_pending_reports():
+    """Retorna os ids de todas as fiscalizações marcadas com [Gerar], na ordem da planilha"""
+    inspections = get_sheet("inspections")
     not_done_reports = inspections[
         inspections["Relatório Gerado"].str.lower() == "gerar"
     ]
-    if not not_done_reports.empty:
-        return int(not_done_reports["ID da Fiscalização"].iloc[0])
+    return [int(report_id) for report_id in not_done_reports["ID da Fiscalização"]]
+
+
+def get_this_report():
+    """Retorna o id referente a fiscalização atual baseado em qual linha estiver escrito [Gerar]"""
+    pending_reports = get_pending_reports()
+    if pending_reports:
+        return pending_reports[0]
     else:
         print("❌ Todos os relatórios já foram gerados.")
 
 
-def get_inspections_data():
-    """Retorna os dados da fiscalização atual"""
-    this_report_non_conformities = get_non_conformities()
+def get_inspections_data(this_report, this_report_non_conformities=None):
+    """
+    Retorna os dados da fiscalização informada.
+    this_report_non_conformities: NCs já filtradas da fiscalização, para não filtrar a planilha novamente
+    """
+    if this_report_non_conformities is None:
+        this_report_non_conformities = get_non_conformities(this_report)
     total_ncs = len(this_report_non_conformities.index)
-    
-    this_report = get_this_report()
-    if this_report is None:
-        return None
 
+    inspections = get_sheet("inspections")
     data_row = inspections[inspections["ID da Fiscalização"] == this_report]
 
     if data_row.empty:
@@ -48,10 +250,7 @@ def get_inspections_data():
     data["Total NCS Atual (palavra)"] = num2words(data["Total NCS Atual"], lang='pt')
     
     if "Tipo da Fiscalização" in data:
-        report_type = str(data["Tipo da Fiscalização"]).strip().lower()
-        report_type = unidecode(report_type)       
-        report_type = report_type.replace(" ", "") 
-        data["Tipo da Fiscalização"] = report_type
+        data["Tipo da Fiscalização"] = normalize_report_type(data["Tipo da Fiscalização"])
         
     if data["Tipo da Fiscalização"] == "agua":
         data["SAA ou SEE"] = "SAA"
@@ -60,9 +259,9 @@ def get_inspections_data():
     return data
 
 
-def get_non_conformities():
-    """Retorna as não conformidades do relatório atual que vai ser gerado"""
-    this_report_id = get_this_report()
+def get_non_conformities(this_report_id):
+    """Retorna as não conformidades da fiscalização informada"""
+    non_conformities = get_sheet("non_conformities")
     this_report_non_conformities = non_conformities[non_conformities["ID da Fiscalização"] == this_report_id].copy()
     this_report_non_conformities["Sigla"] = this_report_non_conformities["Unidade"].str.extract(r'^(.*?)\s*-')
     if not this_report_non_conformities.empty:
@@ -71,27 +270,46 @@ def get_non_conformities():
         print("❌ Não foram cadastradas Não-Conformidades Referentes ao relátorio que deve ser gerado.")
 
 
-def mark_report_as_finished():
-    """Troca o status da linha de relatorio gerado para Concluido, para finalizar relatorio"""
-    this_report_id = get_this_report()
-    wb = load_workbook(SHEET_PATH, keep_vba=True)
-    ws = wb["Fiscalizações"]
-    id_col = None
-    finished_col = None
-    for col in range(1, ws.max_column + 1):
-        header = str(ws.cell(row=1, column=col).value).strip().lower()
-        if header in ["id", "id da fiscalização"]:
-            id_col = col
-        elif header in ["relatório gerado", "relatorio gerado"]:
-            finished_col = col
-    if id_col is None or finished_col is None:
+def mark_report_as_finished(report_ids):
+    """
+    Troca o status da linha de relatorio gerado para Concluido, para finalizar relatorio.
+    report_ids: lista de ids para marcar de uma vez (no modo em lote, todos os relatórios gerados).
+    Só as células de status da aba "Fiscalizações" são alteradas, direto no XML do .xlsm, em uma única gravação;
+    o resto do arquivo (outras abas, macros) fica idêntico.
+    """
+    if not report_ids:
         return
-    target_row = None
-    for row in range(2, ws.max_row + 1):
-        if ws.cell(row=row, column=id_col).value == this_report_id:
-            target_row = row
-            break
-    if target_row is None:
-        return
-    ws.cell(row=target_row, column=finished_col).value = "Concluido"
-    wb.save(SHEET_PATH)
\ No newline at end of file
+    previous_key = get_workbook_key()
+    close_workbook()
+    unchanged_since_read = file_digest(SHEET_PATH) == previous_key
+
+    updated = update_column_by_key(
+        SHEET_PATH, "Fiscalizações",
+        key_headers=["id", "id da fiscalização"],
+        value_headers=["relatório gerado", "relatorio gerado"],
+        keys=report_ids,
+        value="Concluido",
+    )
+    if updated and unchanged_since_read:
+        carry_over_sheets_cache(previous_key, updated)
+
+
+def carry_over_sheets_cache(previous_key, report_ids):
+    """
+    Depois de marcar os relatórios como Concluido só a coluna de status mudou, então o cache das abas continua valendo:
+    move o cache para a chave do novo conteúdo e atualiza apenas a tabela de fiscalizações
+    """
+    new_key = file_digest(SHEET_PATH)
+    previous_dir = os.path.join(SHEETS_CACHE_PATH, previous_key[:16])
+    new_dir = os.path.join(SHEETS_CACHE_PATH, new_key[:16])
+    if os.path.isdir(previous_dir) and not os.path.exists(new_dir):
+        os.replace(previous_dir, new_dir)
+
+    inspections = sheets.get("inspections")
+    if inspections is not None:
+        inspections.loc[inspections["ID da Fiscalização"].isin(report_ids), "Relatório Gerado"] = "Concluido"
+        save_cached_frame(inspections, get_sheet_cache_path("inspections"))
+    else:
+        cache_path = os.path.join(new_dir, f"inspections-{options_digest(SHEETS['inspections'])}.pkl")
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
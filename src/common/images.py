@@ -1,22 +1,112 @@
+import io
 import os
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageOps
 from docx.image.exceptions import UnrecognizedImageError
 from docx.shared import Inches, Pt
-from common.excel import get_non_conformities 
-from common.utils import set_borders_table, get_images_from_dir, search_paragraph, sanitize_value
-from common.paths import ASSETS_PATH, BASE_PATH
+from common.utils import set_borders_table, get_images_from_dir, walk_assets, find_paragraphs, sanitize_value
+from common.paths import ASSETS_PATH, BASE_PATH, CACHE_PATH
+from common.cache import file_digest, options_digest
+
+
+IMAGES_CACHE_PATH = os.path.join(CACHE_PATH, "imagens")
+# Aumentar quando o processamento mudar, para não reaproveitar imagens processadas do jeito antigo
+IMAGE_PROCESSING_VERSION = 3
+# Quantidade máxima de fotos processadas ao mesmo tempo (o Pillow libera o GIL ao redimensionar e comprimir)
+IMAGE_WORKERS = min(4, os.cpu_count() or 1)
+# Qualidades de JPEG aceitas, da maior para a menor
+JPEG_QUALITIES = list(range(85, 29, -5))
+# Estatísticas das fotos processadas (fora do cache) no relatório atual, lidas por benchmarks/image_encoding.py:
+# {foto original: {"encodes": compressões feitas, "quality": qualidade usada, "source_bytes": tamanho original, "final_bytes": tamanho final}}
+# São zeradas a cada relatório (ver prepare_appendix_images)
+IMAGE_STATS = {}
+
+# Tamanho em que as fotos aparecem nas tabelas de imagens do relatório (polegadas)
+IMAGE_WIDTH_IN = 3.3
+IMAGE_HEIGHT_IN = 2.5
+# Resolução usada para calcular o tamanho em pixels das fotos a partir do tamanho da célula
+IMAGE_DPI = 150
+# Como a foto é levada ao tamanho da célula:
+# - "fit": a foto inteira, na sua proporção, no maior tamanho que cabe na célula (sem bordas gravadas na imagem)
+# - "crop": a foto preenche a célula e o excesso é cortado (mantendo o centro)
+# - "max_dimension": só limita o maior lado a max_dimension px
+# Em todos os modos a foto entra na tabela na sua proporção, encaixada na célula (ver picture_size)
+IMAGE_SIZE_MODE = "fit"
+# Diferença máxima (em bits, de 64) entre os dHash de duas fotos para considerá-las parecidas
+DUPLICATE_MAX_DISTANCE = 5
+# Se True, o apêndice de não conformidades só recebe (e só processa) as fotos citadas em "Nome da Foto"
+# nas NCs da fiscalização, na ordem das NCs. Se False, usa todas as fotos da pasta
+ONLY_REFERENCED_PHOTOS = True
 
 
 # Funções Utilitárias
-def get_file_size_kb(file_path):
+def encode_jpeg(img, quality):
     """
-    Retorna o tamanho de um arquivo em kb
+    Comprime a imagem em JPEG na memória e retorna os bytes
     """
-    return os.path.getsize(file_path) / 1024
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
 
-def convert_to_valid_jpeg(image_path, target_size_kb=(20, 50), max_dimension=800):
+def resize_to_cell(img, size_mode=None, dpi=None, max_dimension=800):
+    """
+    Redimensiona a imagem para o tamanho em pixels da célula onde ela será inserida (IMAGE_WIDTH_IN x IMAGE_HEIGHT_IN em dpi),
+    encaixando na célula com a proporção da foto ("fit") ou cortando para a proporção da célula ("crop"). Ver IMAGE_SIZE_MODE
+    size_mode / dpi: None usa IMAGE_SIZE_MODE / IMAGE_DPI
+    """
+    size_mode = size_mode or IMAGE_SIZE_MODE
+    dpi = dpi or IMAGE_DPI
+    if size_mode == "max_dimension":
+        if max(img.size) > max_dimension:
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        return img
+
+    aspect = IMAGE_WIDTH_IN / IMAGE_HEIGHT_IN
+    width, height = img.size
+    target_size = (round(IMAGE_WIDTH_IN * dpi), round(IMAGE_HEIGHT_IN * dpi))
+    # Só reduz: fotos menores que a célula em dpi não são ampliadas
+    if size_mode == "crop":
+        # Maior recorte da foto na proporção da célula
+        box = (min(width, round(height * aspect)), min(height, round(width / aspect)))
+        if box[0] > target_size[0]:
+            box = target_size
+    elif size_mode == "fit":
+        # A foto inteira, na sua proporção, no maior tamanho que cabe na célula
+        scale = min(target_size[0] / width, target_size[1] / height, 1)
+        box = (max(1, round(width * scale)), max(1, round(height * scale)))
+    else:
+        raise ValueError(f"Modo de tamanho de imagem inválido: '{size_mode}'")
+
+    # Redução inteira rápida antes do LANCZOS (mantendo pelo menos 2x a resolução final, como o reducing_gap do Pillow)
+    factor = int(min(width / box[0], height / box[1]) / 2)
+    if factor > 1:
+        img = img.reduce(factor)
+
+    if size_mode == "crop":
+        return ImageOps.fit(img, box, Image.Resampling.LANCZOS)
+    if img.size == box:
+        return img
+    return img.resize(box, Image.Resampling.LANCZOS)
+
+def picture_size(image_path):
+    """
+    Largura e altura (Inches) com que a foto entra na tabela de imagens: o maior tamanho na proporção da foto
+    que cabe na célula (IMAGE_WIDTH_IN x IMAGE_HEIGHT_IN), sem esticar a foto
+    """
+    with Image.open(image_path) as img:
+        width, height = img.size
+    scale = min(IMAGE_WIDTH_IN / width, IMAGE_HEIGHT_IN / height)
+    return Inches(width * scale), Inches(height * scale)
+
+def convert_to_valid_jpeg(image_path, new_path, target_size_kb=(20, 50), max_dimension=800, size_mode=None, dpi=None):
+        """
+        Converte a imagem para JPEG (RGB, orientação corrigida, no tamanho da célula do relatório - ver resize_to_cell) e grava em new_path,
+        usando a maior qualidade de JPEG_QUALITIES cujo tamanho não passe de target_size_kb[1] (ou a mínima, se nenhuma couber).
+        As tentativas são feitas na memória com busca binária e só o resultado final é gravado. A imagem original não é alterada.
+        """
         try:
             with Image.open(image_path) as img:
                 if img.mode in ('RGBA', 'LA', 'P'):
@@ -30,40 +120,84 @@ def convert_to_valid_jpeg(image_path, target_size_kb=(20, 50), max_dimension=800
 
                 img = ImageOps.exif_transpose(img)
 
-                if max(img.size) > max_dimension:
-                    img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-
-                base_name = os.path.splitext(image_path)[0]
-                new_path = f"{base_name}.jpg"
+                img = resize_to_cell(img, size_mode, dpi, max_dimension)
+
+                max_bytes = target_size_kb[1] * 1024
+                encoded = {}
+
+                # A maior qualidade é testada primeiro: fotos pequenas já cabem nela e não precisam de busca
+                best_quality = JPEG_QUALITIES[0]
+                encoded[best_quality] = encode_jpeg(img, best_quality)
+
+                if len(encoded[best_quality]) > max_bytes:
+                    best_quality = JPEG_QUALITIES[-1]
+                    low, high = 1, len(JPEG_QUALITIES) - 1
+                    while low <= high:
+                        middle = (low + high) // 2
+                        quality = JPEG_QUALITIES[middle]
+                        encoded[quality] = encode_jpeg(img, quality)
+                        if len(encoded[quality]) <= max_bytes:
+                            best_quality = quality
+                            high = middle - 1
+                        else:
+                            low = middle + 1
+
+                data = encoded.get(best_quality) or encode_jpeg(img, best_quality)
+                with open(new_path, 'wb') as file:
+                    file.write(data)
+
+                IMAGE_STATS[image_path] = {
+                    "encodes": len(encoded),
+                    "quality": best_quality,
+                    "source_bytes": os.path.getsize(image_path),
+                    "final_bytes": len(data),
+                }
+                return new_path
 
-                if image_path != new_path and os.path.exists(image_path):
-                    os.remove(image_path)
+        except Exception as e:
+            print(f"❌ Erro ao processar {image_path}: {e}")
+            return None
 
-                quality = 85
-                min_quality = 30
-                step = 5
 
-                while quality >= min_quality:
-                    img.save(new_path, 'JPEG', quality=quality, optimize=True)
-                    size_kb = get_file_size_kb(new_path)
+def get_cached_image_path(image_path, target_size_kb=(20, 50), max_dimension=800, size_mode=None, dpi=None):
+    """
+    Caminho da versão processada da imagem no cache (data/.cache/imagens).
+    O nome vem do hash do conteúdo da foto + parâmetros do processamento, então fotos iguais
+    (mesmo com nomes diferentes) usam o mesmo arquivo, e trocar a foto ou os parâmetros gera outro.
+    """
+    size_mode = size_mode or IMAGE_SIZE_MODE
+    dpi = dpi or IMAGE_DPI
+    params = {"target_size_kb": tuple(target_size_kb), "max_dimension": max_dimension, "size_mode": size_mode, "dpi": dpi,
+              "cell_size_in": (IMAGE_WIDTH_IN, IMAGE_HEIGHT_IN), "version": IMAGE_PROCESSING_VERSION}
+    return os.path.join(IMAGES_CACHE_PATH, f"{file_digest(image_path)[:32]}-{options_digest(params)}.jpg")
 
-                    if target_size_kb[0] <= size_kb <= target_size_kb[1]:
-                        return new_path
 
-                    if size_kb > target_size_kb[1]:
-                        quality -= step
-                    else:
-                        return new_path
+def process_image(image_path, target_size_kb=(20, 50), max_dimension=800, size_mode=None, dpi=None):
+    """
+    Retorna o caminho da versão processada (JPEG otimizado) da imagem, processando só se ainda não estiver no cache.
+    Retorna None se a imagem não puder ser processada.
+    """
+    cached_path = get_cached_image_path(image_path, target_size_kb, max_dimension, size_mode, dpi)
+    if os.path.exists(cached_path):
+        return cached_path
+
+    os.makedirs(IMAGES_CACHE_PATH, exist_ok=True)
+    temp_path = f"{cached_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    if convert_to_valid_jpeg(image_path, temp_path, target_size_kb, max_dimension, size_mode, dpi) is None:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+    os.replace(temp_path, cached_path)
+    return cached_path
 
-                img.save(new_path, 'JPEG', quality=min_quality, optimize=True)
-                size_kb = get_file_size_kb(new_path)
-                return new_path
+#----------------------------------
 
-        except Exception as e:
-            print(f"❌ Erro ao processar {image_path}: {e}")
-            return None
 
-#----------------------------------
+def is_no_photo(value):
+    """
+    Verifica se o texto de "Nome da Foto" indica que a NC não tem foto ("Sem Foto", "sem foto", "SEMFOTO"...)
+    """
+    return sanitize_value(value).replace(" ", "") == "semfoto"
 
 
 def build_caption_map(df, col_img="Nome da Foto", col_unit="Unidade", col_desc="Não Conformidade"):
@@ -77,28 +211,196 @@ def build_caption_map(df, col_img="Nome da Foto", col_unit="Unidade", col_desc="
     for _, row in df.iterrows():
         image_field = row[col_img]
 
-        if not isinstance(image_field, str) or sanitize_value(image_field) == "semfoto":
+        if not isinstance(image_field, str) or is_no_photo(image_field):
             continue
-        image_names = [img.strip() for img in re.split(r'[,;]', image_field) if sanitize_value(img) != "semfoto" and img.strip() != ""]
+        image_names = [img.strip() for img in re.split(r'[,;]', image_field) if not is_no_photo(img) and img.strip() != ""]
         for image_name in image_names:
             captions[image_name] = f"{image_name} - {row[col_unit]}: {row[col_desc]}"
     return captions
 
 
-def process_images(path=ASSETS_PATH):
+def list_images(path=ASSETS_PATH):
     """
-    Processa imagens para JPEGs com qualidade iterativa visando tamanho entre target_size_kb
+    Lista as fotos (.jpg, .jpeg, .png) da pasta e subpastas em ordem alfabética de pasta e nome,
+    para que a ordem das fotos no relatório não dependa da ordem do sistema de arquivos
     """
-
-    total = 0
-    success = 0
-    for root, dirs, files in os.walk(path):
+    image_paths = []
+    for root, dirs, files in walk_assets(path):
         for filename in files:
             if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                image_path = os.path.join(root, filename)
-                total += 1
-                if convert_to_valid_jpeg(image_path):
-                    success += 1
+                image_paths.append(os.path.join(root, filename))
+    return image_paths
+
+
+def start_processing_images(path=ASSETS_PATH, workers=IMAGE_WORKERS, image_paths=None):
+    """
+    Começa a processar as fotos em segundo plano (no máximo `workers` ao mesmo tempo) e retorna na hora,
+    para que as tabelas do relatório sejam montadas enquanto isso.
+    image_paths: fotos a processar (padrão: todas as da pasta)
+    O resultado é obtido com wait_processed_images.
+    """
+    if image_paths is None:
+        image_paths = list_images(path)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imagens")
+    pending = [(image_path, executor.submit(process_image, image_path)) for image_path in image_paths]
+    executor.shutdown(wait=False)
+    return pending
+
+
+def wait_processed_images(pending):
+    """
+    Espera o processamento iniciado por start_processing_images e retorna {foto original: foto processada},
+    na mesma ordem de list_images
+    """
+    processed = {}
+    for image_path, future in pending:
+        processed_path = future.result()
+        if processed_path:
+            processed[image_path] = processed_path
+    return processed
+
+
+def process_images(path=ASSETS_PATH, workers=IMAGE_WORKERS, image_paths=None):
+    """
+    Processa imagens para JPEGs com qualidade iterativa visando tamanho entre target_size_kb.
+    As fotos originais em assets/ não são alteradas: as versões processadas ficam no cache (data/.cache/imagens)
+    e fotos que não mudaram desde a última execução só custam o cálculo do hash.
+    Retorna um dicionário {foto original: foto processada}.
+    """
+    return wait_processed_images(start_processing_images(path, workers, image_paths))
+
+def image_dhash(image_path, hash_size=8):
+    """
+    Hash perceptual (dHash) da foto: compara o brilho de pixels vizinhos numa miniatura em tons de cinza.
+    Fotos parecidas (recomprimidas, redimensionadas, com pequenas edições) têm hashes com poucos bits diferentes.
+    """
+    with Image.open(image_path) as img:
+        img.draft('L', (hash_size * 4, hash_size * 4))
+        small = ImageOps.exif_transpose(img).convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def find_duplicate_images(path=ASSETS_PATH, max_distance=DUPLICATE_MAX_DISTANCE, image_paths=None):
+    """
+    Procura fotos repetidas na pasta (ou só entre image_paths, se informado).
+    Retorna (iguais, parecidas):
+    - iguais: listas de fotos com o mesmo conteúdo (mesmo hash do arquivo)
+    - parecidas: pares (foto, foto, diferença) cujo dHash difere em até max_distance bits
+    """
+    if image_paths is None:
+        image_paths = list_images(path)
+
+    by_digest = {}
+    for image_path in image_paths:
+        by_digest.setdefault(file_digest(image_path), []).append(image_path)
+    identical = [paths for paths in by_digest.values() if len(paths) > 1]
+
+    hashes = []
+    for paths in by_digest.values():
+        try:
+            hashes.append((paths[0], image_dhash(paths[0])))
+        except Exception:
+            continue
+
+    similar = []
+    for i, (first_path, first_hash) in enumerate(hashes):
+        for second_path, second_hash in hashes[i + 1:]:
+            distance = bin(first_hash ^ second_hash).count("1")
+            if distance <= max_distance:
+                similar.append((first_path, second_path, distance))
+    return identical, similar
+
+
+def report_duplicate_images(path=ASSETS_PATH, max_distance=DUPLICATE_MAX_DISTANCE, image_paths=None):
+    """
+    Avisa antes da geração sobre fotos iguais ou muito parecidas na pasta.
+    Fotos iguais entram uma única vez no .docx (as legendas continuam separadas), mas costumam indicar foto repetida por engano.
+    """
+    identical, similar = find_duplicate_images(path, max_distance, image_paths)
+    for paths in identical:
+        names = ", ".join(os.path.splitext(os.path.basename(image_path))[0] for image_path in paths)
+        print(f"⚠️ Fotos iguais: {names}")
+    for first_path, second_path, distance in similar:
+        first_name = os.path.splitext(os.path.basename(first_path))[0]
+        second_name = os.path.splitext(os.path.basename(second_path))[0]
+        print(f"⚠️ Fotos muito parecidas: {first_name} e {second_name} (diferença {distance}/64)")
+    return identical, similar
+
+
+def resolve_referenced_images(captions, image_paths):
+    """
+    Associa cada foto citada nas NCs (chaves de build_caption_map) ao seu arquivo, pelo nome sem extensão
+    (se não achar igual, compara sem acentos e sem diferença de maiúsculas).
+    Retorna (arquivos na ordem das NCs, nomes citados sem arquivo, arquivos não citados)
+    """
+    by_name = {}
+    by_sanitized_name = {}
+    for image_path in image_paths:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        by_name.setdefault(image_name, image_path)
+        by_sanitized_name.setdefault(sanitize_value(image_name), image_path)
+
+    referenced = []
+    missing = []
+    for image_name in captions:
+        image_path = by_name.get(image_name) or by_sanitized_name.get(sanitize_value(image_name))
+        if image_path is None:
+            missing.append(image_name)
+        elif image_path not in referenced:
+            referenced.append(image_path)
+
+    unreferenced = [image_path for image_path in image_paths if image_path not in referenced]
+    return referenced, missing, unreferenced
+
+
+def select_appendix_images(context, path=None):
+    """
+    Escolhe as fotos de cada apêndice: {"fotos_nao_conformidades": [...], "fotos_condicoes_gerais": [...]}.
+    Com ONLY_REFERENCED_PHOTOS, as fotos de não conformidades são só as citadas nas NCs da fiscalização (na ordem das NCs),
+    e é feita uma checagem prévia avisando fotos citadas que não existem na pasta e fotos da pasta que não são citadas.
+    As fotos de condições gerais são todas as da pasta.
+    path: pasta de fotos (padrão: context.assets_path)
+    """
+    images_by_folder = get_images_from_dir(path or context.assets_path)
+    appendix_images = {folder: images_by_folder[folder] for folder in ("fotos_nao_conformidades", "fotos_condicoes_gerais") if folder in images_by_folder}
+
+    if ONLY_REFERENCED_PHOTOS:
+        captions = build_caption_map(context.non_conformities)
+        referenced, missing, unreferenced = resolve_referenced_images(captions, appendix_images.get("fotos_nao_conformidades", []))
+        if missing:
+            print(f"⚠️ Fotos citadas nas não conformidades e não encontradas em fotos_nao_conformidades: {', '.join(missing)}")
+        if unreferenced:
+            names = ", ".join(os.path.splitext(os.path.basename(image_path))[0] for image_path in unreferenced)
+            print(f"⚠️ Fotos ignoradas por não serem citadas em nenhuma não conformidade: {names}")
+
+        appendix_images.pop("fotos_nao_conformidades", None)
+        if referenced:
+            appendix_images = {"fotos_nao_conformidades": referenced, **appendix_images}
+
+    return appendix_images
+
+
+def prepare_appendix_images(context, path=None):
+    """
+    Checagem prévia das fotos da fiscalização (fotos citadas x arquivos, fotos repetidas) e início do processamento
+    em segundo plano apenas das fotos que vão para o relatório.
+    Retorna (fotos por apêndice, processamento pendente), usados por create_all_appendix_images
+    """
+    path = path or context.assets_path
+    IMAGE_STATS.clear()
+    appendix_images = select_appendix_images(context, path)
+    image_paths = [image_path for paths in appendix_images.values() for image_path in paths]
+    report_duplicate_images(path, image_paths=image_paths)
+    return appendix_images, start_processing_images(path, image_paths=image_paths)
+
 
 def validate_image(img_path):
     """
@@ -116,18 +418,20 @@ def validate_image(img_path):
         return False, str(e)
 
 
-def create_table_images(document, insert_coord, list_of_images_path, captions=None, title_text="Registros Fotográficos"):
+def create_table_images(document, insert_coord, list_of_images_path, captions=None, title_text="Registros Fotográficos", processed_images=None):
     """
     Cria tabela de imagens com legenda.
+    processed_images: {foto original: foto processada}. A legenda usa o nome da foto original e a tabela recebe a processada
     """
     valid_images = []
 
     for img_path in list_of_images_path:
 
-        abs_img_path = os.path.join(BASE_PATH, img_path)
+        embed_path = processed_images.get(img_path, img_path) if processed_images else img_path
+        abs_img_path = os.path.join(BASE_PATH, embed_path)
         is_valid, error_msg = validate_image(abs_img_path)
         if is_valid:
-            valid_images.append(abs_img_path)
+            valid_images.append((img_path, abs_img_path))
         else:
             print(f"⚠️ Imagem inválida ignorada: {os.path.basename(img_path)} - {error_msg}")
 
@@ -143,22 +447,27 @@ def create_table_images(document, insert_coord, list_of_images_path, captions=No
     title = document.add_paragraph(title_text)
     title.style = 'Arial10'
 
+    sanitized_captions = {sanitize_value(name): caption for name, caption in captions.items()} if captions else {}
+
     num_images = len(valid_images)
     num_rows = ((num_images + 1) // 2) * 2
     images_table = document.add_table(rows=num_rows, cols=2)
 
-    for i, img_path in enumerate(valid_images):
+    for i, (img_path, abs_img_path) in enumerate(valid_images):
         image_line = i // 2 * 2
         subtitle_line = image_line + 1
         column = i % 2
 
         try:
-            images_table.cell(image_line, column).paragraphs[0].add_run().add_picture(
-                img_path, width=Inches(3.3), height=Inches(2.5)
-            )
+            # Fotos iguais têm o mesmo arquivo processado e o python-docx reaproveita a mesma imagem do pacote (pelo SHA1)
+            width, height = picture_size(abs_img_path)
+            images_table.cell(image_line, column).paragraphs[0].add_run().add_picture(abs_img_path, width=width, height=height)
 
             image_name = os.path.splitext(os.path.basename(img_path))[0]
-            subtitle = captions.get(image_name, f"{image_name} - SEM LEGENDA") if captions else image_name
+            if captions:
+                subtitle = captions.get(image_name) or sanitized_captions.get(sanitize_value(image_name), f"{image_name} - SEM LEGENDA")
+            else:
+                subtitle = image_name
 
             cell = images_table.cell(subtitle_line, column)
             paragraph = cell.paragraphs[0]
@@ -187,29 +496,31 @@ def create_table_images(document, insert_coord, list_of_images_path, captions=No
     return images_table
 
 
-def divide_images(document, insert_coord, list_of_images_path, captions=None, block_size=6):
+def divide_images(document, insert_coord, list_of_images_path, captions=None, block_size=6, processed_images=None):
     """
     Divide imagens em blocos de N e cria tabelas
     """
     for i in range(0, len(list_of_images_path), block_size):
         table_images = list_of_images_path[i:i + block_size]
-        insert_coord = create_table_images(document, insert_coord, table_images, captions)
+        insert_coord = create_table_images(document, insert_coord, table_images, captions, processed_images=processed_images)
     return insert_coord
 
 
-def create_all_appendix_images(document, text_nc):
+def create_all_appendix_images(document, context, text_nc, appendix_images=None, processed_images=None):
     """
     Cria todas tabelas de imagens para os apêndices, processando as imagens primeiro
+    appendix_images / processed_images: resultado de prepare_appendix_images (com wait_processed_images),
+    quando as fotos já foram escolhidas e processadas em segundo plano
     """
-    process_images(ASSETS_PATH)
-
-    images_by_folder = get_images_from_dir(ASSETS_PATH)
-
-    if "fotos_nao_conformidades" in images_by_folder:
-        df_ncs = get_non_conformities()
-        captions_nc = build_caption_map(df_ncs)
-        divide_images(document, text_nc, images_by_folder["fotos_nao_conformidades"], captions=captions_nc, block_size=6)
-
-    if "fotos_condicoes_gerais" in images_by_folder:
-        text_info = document.paragraphs[search_paragraph(document, "APÊNDICE 2 – CONDIÇÕES GERAIS")[-1]]
-        divide_images(document, text_info, images_by_folder["fotos_condicoes_gerais"], captions=None, block_size=6)
\ No newline at end of file
+    if appendix_images is None:
+        appendix_images = select_appendix_images(context, context.assets_path)
+    if processed_images is None:
+        processed_images = process_images(context.assets_path, image_paths=[image_path for paths in appendix_images.values() for image_path in paths])
+
+    if "fotos_nao_conformidades" in appendix_images:
+        captions_nc = build_caption_map(context.non_conformities)
+        divide_images(document, text_nc, appendix_images["fotos_nao_conformidades"], captions=captions_nc, block_size=6, processed_images=processed_images)
+
+    if "fotos_condicoes_gerais" in appendix_images:
+        text_info = find_paragraphs(document, "APÊNDICE 2 – CONDIÇÕES GERAIS")[-1]
+        divide_images(document, text_info, appendix_images["fotos_condicoes_gerais"], captions=None, block_size=6, processed_images=processed_images)
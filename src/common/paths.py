@@ -7,4 +7,16 @@ DATA_PATH = os.path.join(BASE_PATH, "data")
 REPORTS_PATH = os.path.join(BASE_PATH, "reports")
 ASSETS_PATH = os.path.join(BASE_PATH, "assets")
 
-SHEET_PATH = os.path.join(DATA_PATH, "Cadastro das Fiscalizações.xlsm")
\ No newline at end of file
+SHEET_PATH = os.path.join(DATA_PATH, "Cadastro das Fiscalizações.xlsm")
+CACHE_PATH = os.path.join(DATA_PATH, ".cache")
+
+
+def get_assets_path(report_id):
+    """
+    Pasta com as fotos da fiscalização: assets/<ID> (ex: assets/3/fotos_nao_conformidades) quando existir,
+    senão a pasta assets/ (um único conjunto de fotos por vez)
+    """
+    inspection_path = os.path.join(ASSETS_PATH, str(int(report_id)))
+    if os.path.isdir(inspection_path):
+        return inspection_path
+    return ASSETS_PATH
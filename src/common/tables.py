@@ -1,10 +1,27 @@
+import copy
 import pandas as pd
-from docx.shared import Pt
-from docx.enum.table import WD_ALIGN_VERTICAL, WD_TABLE_ALIGNMENT
+from docx.shared import Pt, Inches
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from common.excel import get_non_conformities, get_inspections_data, units_df
-from common.utils import search_paragraph, apply_background_color, set_column_widths, format_dict_values, set_table_margins, sanitize_value, set_borders_table, to_rows_data
-from common.paths import SHEET_PATH
+from docx.enum.style import WD_STYLE_TYPE
+from common.excel import get_sheet
+from common.utils import find_paragraphs, apply_background_color, set_column_widths, format_dict_values, sanitize_value, to_rows_data
+
+
+# Estilo das tabelas do relatório: bordas pretas simples e conteúdo centralizado na vertical.
+# Se o modelo .docx já tiver um estilo de tabela com esse nome, o do modelo é usado (e pode ser alterado no Word)
+TABLE_STYLE_NAME = "Tabela Relatório"
+
+# Tipos de unidade (coluna "Tipo" do cadastro, sem acentos e em minúsculo) listados na tabela 2 de cada tipo de fiscalização
+UNIT_TYPES = {
+    "agua": ["eea", "eeab", "eeat", "eta", "rel/rap", "rel", "rap", "poço", "poco"],
+    "esgoto": ["eee", "ete"],
+}
+
+# Índice do cadastro de unidades deste processo (ver get_units_registry)
+units_registry = None
 
 
 def create_generic_table(document, rows_data, text_after_paragraph, col_widths=None,
@@ -23,6 +40,10 @@ def create_generic_table(document, rows_data, text_after_paragraph, col_widths=N
     cell_padding: preenchimento interno das células
     align_left: se True, alinha conteúdo à esquerda
     font_size: tamanho da fonte do conteúdo
+
+    As linhas são montadas direto no XML (ver append_table_rows), sem criar um objeto do python-docx por célula.
+    Bordas, alinhamento vertical, fonte e alinhamento do texto vêm de estilos (get_table_style / get_cell_paragraph_style)
+    e as margens das células são definidas uma vez para a tabela; cada célula só guarda largura, mesclagem e fundo do cabeçalho.
     """
     if not rows_data:
         print("⚠️ Nenhum dado para criar tabela.")
@@ -31,42 +52,131 @@ def create_generic_table(document, rows_data, text_after_paragraph, col_widths=N
     n_cols = max(len(row) for row in rows_data)
     table = document.add_table(rows=0, cols=n_cols)
     table.alignment = WD_TABLE_ALIGNMENT.CENTER
+    table.style = get_table_style(document)
+    set_table_cell_margins(table, cell_padding)
+
+    append_table_rows(table, rows_data, col_widths=col_widths, align_left=align_left, font_size=font_size)
+
+    find_paragraphs(document, text_after_paragraph)[0]._element.addnext(table._element)
+
+
+def get_table_style(document):
+    """
+    Retorna o estilo de tabela TABLE_STYLE_NAME do documento, criando-o (uma vez por documento) se o modelo não tiver:
+    bordas simples pretas em toda a tabela e células centralizadas na vertical
+    """
+    styles = document.styles
+    if TABLE_STYLE_NAME in styles:
+        return styles[TABLE_STYLE_NAME]
+
+    style = styles.add_style(TABLE_STYLE_NAME, WD_STYLE_TYPE.TABLE)
+    style.base_style = styles.default(WD_STYLE_TYPE.TABLE)
+    borders = "".join(f'<w:{side} w:val="single" w:sz="8" w:space="0" w:color="000000"/>'
+                      for side in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    style.element.append(parse_xml(f'<w:tblPr {nsdecls("w")}><w:tblBorders>{borders}</w:tblBorders></w:tblPr>'))
+    style.element.append(parse_xml(f'<w:tcPr {nsdecls("w")}><w:vAlign w:val="center"/></w:tcPr>'))
+    return style
+
+
+def get_cell_paragraph_style(document, font_size=10, bold=False, align_left=False, font_name="Arial"):
+    """
+    Retorna o estilo de parágrafo do texto das células (ex: "Tabela Cabeçalho Arial 10", "Tabela Texto Arial 8 Esquerda"),
+    criando-o se o documento ainda não tiver. Baseado no Normal, só muda fonte, tamanho, negrito e alinhamento.
+    """
+    styles = document.styles
+    name = f"Tabela {'Cabeçalho' if bold else 'Texto'} {font_name} {font_size:g}{' Esquerda' if align_left else ''}"
+    if name in styles:
+        return styles[name]
+
+    style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = styles.default(WD_STYLE_TYPE.PARAGRAPH)
+    style.quick_style = False
+    style.font.name = font_name
+    style.font.size = Pt(font_size)
+    if bold:
+        style.font.bold = True
+    style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT if align_left else WD_ALIGN_PARAGRAPH.CENTER
+    return style
+
+
+def set_table_cell_margins(table, cell_padding=0.1):
+    """
+    Define as margens internas (em cm) de todas as células da tabela de uma vez (w:tblCellMar),
+    em vez de repetir w:tcMar em cada célula
+    """
+    if cell_padding is None:
+        return
+    margin = int(cell_padding * 567)
+    margins = "".join(f'<w:{side} w:w="{margin}" w:type="dxa"/>' for side in ("top", "start", "bottom", "end"))
+    tblCellMar = parse_xml(f'<w:tblCellMar {nsdecls("w")}>{margins}</w:tblCellMar>')
+
+    tblPr = table._tbl.tblPr
+    tblLook = tblPr.find(qn("w:tblLook"))
+    if tblLook is not None:
+        tblLook.addprevious(tblCellMar)
+    else:
+        tblPr.append(tblCellMar)
+
+
+def new_cell_template(width, style_id, grid_span=None, bg_color=None):
+    """
+    Monta o XML (w:tc) de uma célula vazia: largura (twips), mesclagem, fundo (só quando houver) e o parágrafo com o estilo style_id.
+    O resto da formatação vem do estilo da tabela e do estilo do parágrafo.
+    """
+    return parse_xml(
+        f'<w:tc {nsdecls("w")}>'
+        f'<w:tcPr>'
+        f'<w:tcW w:type="dxa" w:w="{width}"/>'
+        + (f'<w:gridSpan w:val="{grid_span}"/>' if grid_span else '')
+        + (f'<w:shd w:val="clear" w:color="auto" w:fill="{bg_color}"/>' if bg_color else '')
+        + f'</w:tcPr>'
+        f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr><w:r/></w:p>'
+        f'</w:tc>'
+    )
+
+
+def append_table_rows(table, rows_data, col_widths=None, align_left=False, font_size=10,
+                      font_name="Arial", bg_color="D9D9D9"):
+    """
+    Adiciona todas as linhas de rows_data à tabela (criada com 0 linhas) numa única passada pelo XML.
+    Cada tipo de célula (cabeçalho, subtítulo mesclado e dado, por coluna) é montado uma vez com new_cell_template
+    e copiado para cada célula, só trocando o texto. Ver create_generic_table para o formato de rows_data.
+    """
+    tbl = table._tbl
+    document = table.part.document
+    n_cols = len(tbl.tblGrid.gridCol_lst)
+    grid_widths = [int(grid_col.get(qn("w:w"))) for grid_col in tbl.tblGrid.gridCol_lst]
+
+    # Larguras como o set_column_widths deixaria: colunas sem largura informada ficam com a do grid,
+    # e a célula mesclada fica com a última largura aplicada (ou a soma do grid, sem col_widths)
+    widths = list(grid_widths)
+    merged_width = sum(grid_widths)
+    if col_widths:
+        for j, width in enumerate(col_widths[:n_cols]):
+            widths[j] = Inches(width).twips
+        merged_width = Inches(col_widths[min(len(col_widths), n_cols) - 1]).twips
+
+    header_style = get_cell_paragraph_style(document, font_size, bold=True, align_left=align_left, font_name=font_name).style_id
+    data_style = get_cell_paragraph_style(document, font_size, bold=False, align_left=align_left, font_name=font_name).style_id
+    header_cells = [new_cell_template(width, header_style, bg_color=bg_color) for width in widths]
+    data_cells = [new_cell_template(width, data_style) for width in widths]
+    merged_cell = new_cell_template(merged_width, header_style, grid_span=n_cols if n_cols > 1 else None, bg_color=bg_color)
 
     for i, row in enumerate(rows_data):
-        row_cells = table.add_row().cells
+        tr = parse_xml(f'<w:tr {nsdecls("w")}/>')
 
         if len(row) == 1 or len(row) < n_cols:
-            merged_cell = row_cells[0]
-            for c in row_cells[1:]:
-                merged_cell = merged_cell.merge(c)
-            format_header_cell(merged_cell, row[0], font_size=font_size)
-            set_table_margins(merged_cell, top=cell_padding, bottom=cell_padding,
-                              start=cell_padding, end=cell_padding)
-
+            cells = [(merged_cell, str(row[0]))]
         elif i == 0:
-            for j, value in enumerate(row):
-                format_header_cell(row_cells[j], value, font_size=font_size)
-                set_table_margins(row_cells[j], top=cell_padding, bottom=cell_padding,
-                                  start=cell_padding, end=cell_padding)
-
+            cells = [(header_cells[j], str(value)) for j, value in enumerate(row)]
         else:
-            for j, value in enumerate(row):
-                format_data_cell(row_cells[j], value, font_size=font_size)
-                set_table_margins(row_cells[j], top=cell_padding, bottom=cell_padding,
-                                  start=cell_padding, end=cell_padding)
-
-    if align_left:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-    set_borders_table(table)
-    if col_widths:
-        set_column_widths(table, *col_widths)
+            cells = [(data_cells[j], "" if pd.isna(value) else str(value)) for j, value in enumerate(row)]
 
-    paragraph_index = search_paragraph(document, text_after_paragraph)[0]
-    document.paragraphs[paragraph_index]._element.addnext(table._element)
+        for template, text in cells:
+            tc = copy.deepcopy(template)
+            tc[-1][-1].text = text
+            tr.append(tc)
+        tbl.append(tr)
 
 
 def create_abbreviations_table(document, text):
@@ -102,13 +212,13 @@ def create_abbreviations_table(document, text):
     create_generic_table(document, abbreviations, text, col_widths=[1, 9], align_left=True)
     
     
-def create_general_information_table(document, text):
+def create_general_information_table(document, context, text):
     """
     Cria a tabela de Informações gerais da fiscalização. Sobre o regulador, o regulado e o titular
     Formato: 17 linhas x 2 colunas.
     Linha 1/6/11: Titulos (3.1 DO TITULAR, 3.2 DO REGULADO, 3.3 DO REGULADOR)
     """
-    report_data = get_inspections_data()
+    report_data = context.data
     
     general_info = [
         ["3.1 DO TITULAR"],
@@ -133,7 +243,7 @@ def create_general_information_table(document, text):
     create_generic_table(document, rows_data=general_info, text_after_paragraph=text, col_widths=[1, 9], align_left=True)
 
 
-def create_documents_table(document, text):
+def create_documents_table(document, context, text):
     """
     Cria a tabela 1 - relativa as documentações necessarias para o processo, se elas foram enviadas ou não e porquê
     Formato: 12 linhas x 4 colunas.
@@ -141,14 +251,13 @@ def create_documents_table(document, text):
     Linha 2-12: valores correspondentes
     """
     
-    report_data = get_inspections_data()
-    report_data["Tipo da Fiscalização"] = sanitize_value(report_data["Tipo da Fiscalização"])
-    if report_data["Tipo da Fiscalização"] == "agua":
-        documents_excel = pd.read_excel(SHEET_PATH, sheet_name='Envio de Documentos', header=1, nrows=11)
-    if report_data["Tipo da Fiscalização"] == "esgoto":
-        documents_excel = pd.read_excel(SHEET_PATH, sheet_name='Envio de Documentos', header=15)
+    if context.inspection_type == "agua":
+        documents_excel = get_sheet("documents_water")
+    if context.inspection_type == "esgoto":
+        documents_excel = get_sheet("documents_sewage")
     df_documents = documents_excel.copy()
     table = document.add_table(rows=1, cols=len(df_documents.columns))
+    table.style = get_table_style(document)
     set_column_widths(table, 6.5, 0.5, 0.5, 6.5)
 
     for idx, col_name in enumerate(df_documents.columns):
@@ -159,54 +268,67 @@ def create_documents_table(document, text):
         for idx, value in enumerate(row):
             format_data_cell(cells[idx], value, font_size=10)
 
-    set_borders_table(table)
-    paragraph_index = search_paragraph(document, text)[0]
-    document.paragraphs[paragraph_index]._element.addnext(table._element)
+    find_paragraphs(document, text)[0]._element.addnext(table._element)
+
+
+def normalize_column(values):
+    """sanitize_value de uma coluna inteira, calculado uma vez por valor diferente (a planilha repete muito municípios e tipos)"""
+    unique_values = values.unique()
+    return values.map(dict(zip(unique_values, (sanitize_value(value) for value in unique_values))))
+
+
+def get_units_registry():
+    """
+    Cadastro de unidades ('Cadastrar Unidades') indexado por (município normalizado, "agua"/"esgoto"), montado uma única vez
+    por processo: cada valor leva as unidades daquele município e sistema já ordenadas pelo nome.
+    É refeito só se a aba for lida de novo (ex: dados enviados aos processos do modo paralelo).
+    """
+    global units_registry
+    units_df = get_sheet("units")
+    if units_registry is not None and units_registry["source"] is units_df:
+        return units_registry["index"]
+
+    units = units_df.rename(columns=str.strip)
+    systems = {unit_type: system for system, unit_types in UNIT_TYPES.items() for unit_type in unit_types}
+    town = normalize_column(units["Municipio"])
+    system = normalize_column(units["Tipo"]).map(systems)
+
+    index = {}
+    for key, group in units[system.notna()].groupby([town, system], sort=False):
+        index[key] = group.sort_values(by="Unidade", key=lambda col: col.str.lower())[["Sistema", "Unidade", "Observação"]]
+
+    units_registry = {"source": units_df, "index": index}
+    return index
 
 
-def create_town_units_table(document, text):
+def create_town_units_table(document, context, text):
     """
     Cria a tabela 2 - Lista de Todas as Unidades do Município
-    com base na planilha 'Cadastrar Unidades'.
+    com base na planilha 'Cadastrar Unidades' (consultada pelo índice de get_units_registry).
 
     Estrutura esperada da planilha (linha 4 como cabeçalho):
     Municipio | Sistema | Tipo | Unidade | Observação
     """
 
-    report_data = get_inspections_data()
-    report_town = sanitize_value(report_data["Municipio"])
-    inspection_type = sanitize_value(report_data["Tipo da Fiscalização"])
+    report_town = sanitize_value(context.data["Municipio"])
+    inspection_type = context.inspection_type
 
-    units_df.columns = units_df.columns.str.strip()
-
-    units_df["MUNICIPIO_NORMALIZED"] = units_df["Municipio"].apply(sanitize_value)
-    units_df["TIPO_NORMALIZED"] = units_df["Tipo"].apply(sanitize_value)
-
-    filtered_units = units_df[units_df["MUNICIPIO_NORMALIZED"] == report_town]
-
-    if "agua" in inspection_type:
-        allowed_types = ["eea", "eeab", "eeat", "eta", "rel/rap", "rel", "rap", "poço", "poco"]
-    elif "esgoto" in inspection_type:
-        allowed_types = ["eee", "ete"]
-    else:
+    if inspection_type not in UNIT_TYPES:
         print(f"⚠️ Tipo de fiscalização não reconhecido: {inspection_type}")
         return
 
-    filtered_units = filtered_units[filtered_units["TIPO_NORMALIZED"].isin(allowed_types)]
+    filtered_units = get_units_registry().get((report_town, inspection_type))
 
-    if filtered_units.empty:
+    if filtered_units is None:
         print("⚠️ Nenhuma unidade encontrada para este município/tipo de fiscalização.")
         return
 
-    filtered_units = filtered_units.sort_values(by="Unidade", key=lambda col: col.str.lower())
-    
-    filtered_units.insert(0, "ITEM", range(1, len(filtered_units) + 1))
-    final_df = filtered_units[["ITEM", "Sistema", "Unidade", "Observação"]]
-    final_df = final_df.rename(columns={
+    final_df = filtered_units.rename(columns={
         "Sistema": "SISTEMA",
         "Unidade": "UNIDADE",
         "Observação": "OBSERVAÇÃO"
     })
+    final_df.insert(0, "ITEM", range(1, len(final_df) + 1))
 
     rows_data = [final_df.columns.tolist()] 
     for row in final_df.itertuples(index=False, name=None):
@@ -215,7 +337,7 @@ def create_town_units_table(document, text):
     create_generic_table(document=document, rows_data=rows_data, text_after_paragraph=text, col_widths=[0.8, 4, 6, 2], align_left=False)
 
 
-def create_last_report_table(document, text):
+def create_last_report_table(document, context, text):
     """
     Cria a tabela 3 - Com informações relevantes a última fiscalização naquele municipio
     Formato: 5 linhas x 2 colunas.
@@ -225,7 +347,7 @@ def create_last_report_table(document, text):
     Linha 4: DESDOBRAMENTOS
     Linha 5: NCs RESIDUAIS
     """
-    report_data = format_dict_values(get_inspections_data())
+    report_data = format_dict_values(context.data)
     last_report_data = {
         "ÚLTIMA FISCALIZAÇÃO": report_data["Ultima Fiscalização (Data)"],
         "TOTAL DE NCs DA ÚLTIMA FISCALIZAÇÂO": report_data["Total NCS UF"],
@@ -237,14 +359,14 @@ def create_last_report_table(document, text):
     create_generic_table(document, rows, text, col_widths=[2.5, 5], cell_padding=0.4, align_left=True)
 
 
-def create_non_conformities_table(document, text):
+def create_non_conformities_table(document, context, text):
     """
     Cria a tabela de não conformidades.
     Formato: 1+N linhas x 6 colunas.
     Linha 1: cabeçalho (Unidade, Não Conformidad, Nome da Foto, Artigo, Enquadramento, Determinações)
     Linha 2-N: Dados correspondentes
     """
-    df_ncs = get_non_conformities()
+    df_ncs = context.non_conformities
 
     selected_columns = [
         "Unidade", 
@@ -262,25 +384,15 @@ def create_non_conformities_table(document, text):
 
     
 def format_header_cell(cell, text, font_size=10, font_name="Arial", bg_color="D9D9D9"):
-    """Formata célula de cabeçalho: negrito, centralizado e fundo colorido."""
+    """Formata célula de cabeçalho: negrito e centralizado (pelo estilo de parágrafo) e fundo colorido."""
     para = cell.paragraphs[0]
-    para.text = ""
-    run = para.add_run(str(text))
-    run.bold = True
-    run.font.name = font_name
-    run.font.size = Pt(font_size)
-    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+    para.text = str(text)
+    para.style = get_cell_paragraph_style(cell.part.document, font_size, bold=True, font_name=font_name)
     cell._tc.get_or_add_tcPr().append(apply_background_color(bg_color))
 
 
 def format_data_cell(cell, value, font_size=10, font_name="Arial"):
-    """Formata célula de dados: centralizado e sem 'nan'."""
+    """Formata célula de dados: centralizado (pelo estilo de parágrafo) e sem 'nan'."""
     para = cell.paragraphs[0]
-    para.text = ""
-    valor_texto = "" if pd.isna(value) else str(value)
-    run = para.add_run(valor_texto)
-    run.font.name = font_name
-    run.font.size = Pt(font_size)
-    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
\ No newline at end of file
+    para.text = "" if pd.isna(value) else str(value)
+    para.style = get_cell_paragraph_style(cell.part.document, font_size, font_name=font_name)
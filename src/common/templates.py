@@ -0,0 +1,72 @@
+import os
+import copy
+from docx import Document
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from common.paths import DATA_PATH
+from common.utils import document_parts, index_paragraphs, placeholder_paragraphs
+
+
+# Modelo .docx de cada tipo de fiscalização
+TEMPLATE_FILES = {
+    "agua": "RELATÓRIO_AGUA_MODELO.docx",
+    "esgoto": "RELATÓRIO_ESGOTO_MODELO.docx",
+    "comercial": "RELATÓRIO_COMERCIAL_MODELO.docx",
+}
+
+# Modelos já abertos neste processo, pelo caminho do arquivo (ver load_template)
+templates = {}
+
+
+def load_template(path):
+    """
+    Abre e analisa o modelo uma única vez por processo. Junto do documento ficam:
+    - paragraph_texts: texto de cada parágrafo do corpo (âncoras usadas por find_paragraphs)
+    - placeholders: para cada parte (corpo, cabeçalhos e rodapés), a posição dos parágrafos que têm {{...}}
+    Se o arquivo do modelo mudar (data de modificação ou tamanho), ele é lido de novo.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    template = templates.get(path)
+    if template is not None and template["stamp"] == stamp:
+        return template
+
+    document = Document(path)
+    paragraph_texts = [Paragraph(p, document).text for p in document.element.body.iterchildren(qn("w:p"))]
+
+    placeholders = {}
+    for part in document_parts(document):
+        targets = set(part.element.xpath('.//w:p[contains(string(.), "{{")]'))
+        placeholders[str(part.partname)] = [position for position, p in enumerate(part.element.iter(qn("w:p"))) if p in targets]
+
+    template = {"stamp": stamp, "document": document, "paragraph_texts": paragraph_texts, "placeholders": placeholders}
+    templates[path] = template
+    return template
+
+
+def open_template(path):
+    """
+    Retorna uma cópia nova do modelo (sem abrir e analisar o .docx de novo), com o índice de âncoras
+    e os parágrafos com placeholders já localizados na cópia
+    """
+    template = load_template(path)
+    document = copy.deepcopy(template["document"])
+
+    index_paragraphs(document, template["paragraph_texts"])
+
+    paragraphs = []
+    for part in document_parts(document):
+        positions = template["placeholders"].get(str(part.partname), [])
+        if positions:
+            part_paragraphs = list(part.element.iter(qn("w:p")))
+            paragraphs.extend(part_paragraphs[position] for position in positions)
+    placeholder_paragraphs[document.element] = {"paragraphs": paragraphs, "body_elements": set(document.element.body.iterchildren())}
+    return document
+
+
+def decide_report_type(context):
+    """Abre o modelo do tipo da fiscalização (agua, esgoto ou comercial), pelo cache de modelos"""
+    file_name = TEMPLATE_FILES.get(context.inspection_type)
+    if file_name is None:
+        return None
+    return open_template(os.path.join(DATA_PATH, file_name))
@@ -1,21 +1,37 @@
 import os
+import re
 import sys
+import weakref
 from datetime import datetime, date
-from docx import Document
 from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from docx.oxml.ns import qn, nsmap
 from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.text.paragraph import Paragraph
+from lxml import etree
 from unidecode import unidecode
-from common.excel import get_inspections_data
-from common.paths import DATA_PATH, REPORTS_PATH, ASSETS_PATH
+from common.paths import REPORTS_PATH, ASSETS_PATH
 
 
-def next_filename():
+# Padrão dos placeholders no modelo: {{nome}}
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(.*?)\}\}")
+
+# Parágrafos com "{{" dentro de um elemento qualquer do corpo, inclusive o próprio elemento se ele for um parágrafo
+PLACEHOLDER_PARAGRAPHS_XPATH = etree.XPath('descendant-or-self::w:p[contains(string(.), "{{")]', namespaces={"w": nsmap["w"]})
+
+# Índice de âncoras de cada documento aberto, pelo elemento raiz do documento (ver index_paragraphs)
+paragraph_indexes = weakref.WeakKeyDictionary()
+
+# Parágrafos com placeholders de cada documento aberto a partir de um modelo já analisado, junto dos elementos do corpo
+# da cópia do modelo, para achar o que foi inserido depois (ver common.templates e iter_all_paragraphs)
+placeholder_paragraphs = weakref.WeakKeyDictionary()
+
+
+def next_filename(context):
     """Monta o nome do arquivo com o ID da fiscalização e caso houver arquivos já existentes incrementa em numero ao lado. EX: Relatório - ID 2 (1)"""
 
-    inspections_data = get_inspections_data()
-    id = str(int(inspections_data["ID da Fiscalização"])) 
+    id = str(int(context.report_id))
     name = f"RELATÓRIO - ID {id}.docx"
     path = os.path.join(REPORTS_PATH, name)
 
@@ -37,9 +53,22 @@ def is_file_open(path):
         print(f"❌ O arquivo '{path}' está aberto em outro programa. Feche-o e tente novamente.")
         sys.exit(0) 
 
+def walk_assets(path=ASSETS_PATH):
+    """
+    Percorre a pasta de fotos como os.walk (em ordem alfabética), sem entrar nas pastas de outras fiscalizações
+    (assets/<ID>) quando path é a pasta assets/ geral
+    """
+    for root, dirs, files in os.walk(path):
+        if os.path.normpath(root) == os.path.normpath(ASSETS_PATH):
+            dirs[:] = [d for d in dirs if not d.isdigit()]
+        dirs.sort()
+        yield root, dirs, sorted(files)
+
+
 def get_images_from_dir(path=ASSETS_PATH):
     """
     Retorna as imagens organizadas por subpasta (apêndice).
+    path: pasta de fotos da fiscalização (context.assets_path)
     Estrutura de saída:
     {
         "fotos_nao_conformidades": ["./assets/fotos_nao_conformidades/nc1.jpg", "./assets/fotos_nao_conformidades/nc2.png"],
@@ -47,7 +76,7 @@ def get_images_from_dir(path=ASSETS_PATH):
     }
     """
     result = {}
-    for root, dirs, files in os.walk(path):
+    for root, dirs, files in walk_assets(path):
         folder_name = os.path.basename(root)
         images = [os.path.join(root, f) for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
         if images:
@@ -55,17 +84,65 @@ def get_images_from_dir(path=ASSETS_PATH):
     return result
 
 
-def search_paragraph(document, text):
+def index_paragraphs(document, paragraph_texts=None):
+    """
+    Monta, uma única vez por documento, o índice de âncoras: o texto de cada parágrafo do corpo, lido numa só passada.
+    As buscas (find_paragraphs) usam o índice em vez de percorrer document.paragraphs e guardam o resultado de cada texto buscado.
+    O índice guarda os próprios elementos dos parágrafos, então continua válido quando tabelas e parágrafos são inseridos;
+    parágrafos inseridos que servem de âncora devem ser registrados com register_paragraph.
+    paragraph_texts: textos dos parágrafos do corpo já lidos do modelo (cópia ainda sem alterações), para não ler de novo
+    """
+    index = paragraph_indexes.get(document.element)
+    if index is None:
+        body_paragraphs = document.element.body.iterchildren(qn('w:p'))
+        if paragraph_texts is not None:
+            paragraphs = list(zip(body_paragraphs, paragraph_texts))
+        else:
+            paragraphs = [(p, Paragraph(p, document).text) for p in body_paragraphs]
+        index = {"paragraphs": paragraphs, "found": {}}
+        paragraph_indexes[document.element] = index
+    return index
+
+
+def body_paragraphs_in_order(body, paragraphs):
+    """Os parágrafos que ainda estão no corpo do documento, na ordem do documento (os removidos ou movidos são descartados)"""
+    attached = [p for p in paragraphs if p.getparent() is body]
+    attached.sort(key=body.index)
+    return attached
+
+
+def find_paragraphs(document, text):
     """
-    Busca no documento word o texto passado como parametro e retorna a posição dele no documento
-    document: arquivo (objeto)
-    text: texto desejado para buscar
+    Retorna os parágrafos do corpo do documento que contêm o texto, na ordem do documento.
+    Depois da primeira busca de um texto, a resposta vem direto do índice.
     """
-    paragraphs_found_by_search = []
-    for i, p in enumerate(document.paragraphs):
-        if text in p.text:
-            paragraphs_found_by_search.append(i)
-    return paragraphs_found_by_search
+    index = index_paragraphs(document)
+    body = document.element.body
+    found = index["found"].get(text)
+    if found is None:
+        index["paragraphs"] = [(p, paragraph_text) for p, paragraph_text in index["paragraphs"] if p.getparent() is body]
+        found = body_paragraphs_in_order(body, [p for p, paragraph_text in index["paragraphs"] if text in paragraph_text])
+    else:
+        found = [p for p in found if p.getparent() is body]
+    index["found"][text] = found
+    return [Paragraph(p, document) for p in found]
+
+
+def register_paragraph(document, paragraph):
+    """
+    Registra no índice de âncoras um parágrafo inserido no corpo do documento depois do índice montado,
+    para que ele seja encontrado por find_paragraphs (ex: título "APÊNDICE 2 – CONDIÇÕES GERAIS")
+    """
+    index = paragraph_indexes.get(document.element)
+    if index is None:
+        return
+    body = document.element.body
+    paragraph_text = paragraph.text
+    index["paragraphs"].append((paragraph._p, paragraph_text))
+    for text, found in index["found"].items():
+        if text in paragraph_text:
+            index["found"][text] = body_paragraphs_in_order(body, found + [paragraph._p])
+
 
 def format_value(value):
     """
@@ -98,50 +175,77 @@ def sanitize_value(value):
     return unidecode(str(value).strip().lower())
 
 # Funções Utilitarias para outras funções, não utilizar
-def replace_in_paragraph(paragraph, replacements):
+def replace_in_paragraph(paragraph, replacements, unknown_placeholders=None):
         full_text = paragraph.text
-        replaced_any = False
-        for placeholder, value in replacements.items():
-            if placeholder in full_text:
-                full_text = full_text.replace(placeholder, value)
-                replaced_any = True
+        found = set(PLACEHOLDER_PATTERN.findall(full_text))
+        if not found:
+            return
 
-        if replaced_any and paragraph.runs:
+        known = {name for name in found if name in replacements}
+        if unknown_placeholders is not None:
+            unknown_placeholders.update(found - known)
+
+        if known and paragraph.runs:
+            full_text = PLACEHOLDER_PATTERN.sub(lambda match: replacements.get(match.group(1), match.group(0)), full_text)
             first_run = paragraph.runs[0]
             first_run.text = full_text
             first_run.font.color.rgb = RGBColor(0, 0, 0)
             for run in paragraph.runs[1:]:
                 run.text = ''
 
-def set_margin(tag, value, tcMar):
-        if value is not None:
-            margin = tcMar.find(qn(tag))
-            if margin is None:
-                margin = OxmlElement(tag)
-                tcMar.append(margin)
-            margin.set(qn('w:w'), str(int(value * 567))) 
-            margin.set(qn('w:type'), 'dxa')
+def document_parts(document):
+    """Partes do documento que têm texto: o corpo e os cabeçalhos e rodapés"""
+    parts = [document.part]
+    for rel in document.part.rels.values():
+        if not rel.is_external and rel.reltype in (RT.HEADER, RT.FOOTER):
+            parts.append(rel.target_part)
+    return parts
+
+def iter_all_paragraphs(document):
+    """
+    Todos os parágrafos do documento numa única passada pelo XML: corpo, tabelas (inclusive tabelas dentro de tabelas),
+    caixas de texto, cabeçalhos e rodapés. Só os parágrafos que têm "{{" (filtrados pelo próprio XPath) são transformados em Paragraph.
+    Documentos abertos pelo cache de modelos (common.templates) já trazem esses parágrafos localizados; nesse caso só o
+    que foi inserido no corpo depois da cópia (tabelas, títulos, apêndices) passa pelo XPath.
+    """
+    known = placeholder_paragraphs.get(document.element)
+    if known is not None:
+        for p in known["paragraphs"]:
+            yield Paragraph(p, document)
+        for element in document.element.body.iterchildren():
+            if element not in known["body_elements"]:
+                for p in PLACEHOLDER_PARAGRAPHS_XPATH(element):
+                    yield Paragraph(p, document)
+        return
+
+    for part in document_parts(document):
+        for p in part.element.xpath('.//w:p[contains(string(.), "{{")]'):
+            yield Paragraph(p, document)
 
 # ---------------------------------------------------------------
 
-def substitute_placeholders(document, excel_data=get_inspections_data()):
+def substitute_placeholders(document, excel_data):
     """
-    Define um padrão de Strings no documento ({{x}}), e substitui no documento e nas tabelas, de acordo com o dicionário retornado com os dados da fiscalização.
+    Define um padrão de Strings no documento ({{x}}), e substitui no documento, nas tabelas, caixas de texto, cabeçalhos e rodapés,
+    de acordo com o dicionário retornado com os dados da fiscalização.
     Caso houver chaves iguais as Strings realiza a troca. Ex: ({{nome}}) no documento, ele percorre o dicionario e caso aja a chave nome ele troca ({{nome}})
     pelo valor correspondente a chave nome.
+    O documento é percorrido uma única vez e todos os placeholders de cada parágrafo são trocados de uma vez (regex).
+    Placeholders do documento que não existem no dicionário são avisados e retornados.
     """
 
-    replacements = {f"{{{{{k}}}}}": format_value(v) for k, v in excel_data.items()}
+    replacements = {str(k): format_value(v) for k, v in excel_data.items()}
+    unknown_placeholders = set()
+
+    for paragraph in iter_all_paragraphs(document):
+        replace_in_paragraph(paragraph, replacements, unknown_placeholders)
+
+    if unknown_placeholders:
+        names = ", ".join(f"{{{{{name}}}}}" for name in sorted(unknown_placeholders))
+        print(f"⚠️ Placeholders sem valor correspondente na planilha: {names}")
+    return unknown_placeholders
 
-    for p in document.paragraphs:
-        replace_in_paragraph(p, replacements)
-    for table in document.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    replace_in_paragraph(p, replacements)
 
-                
 def apply_background_color(color_hex: str):
     """
     Cria um elemento de sombreado de célula com cor de fundo.
@@ -169,24 +273,6 @@ def set_column_widths(table, *widths):
                 row.cells[col_idx].width = Inches(width)
                 
                 
-def set_table_margins(cell, top=None, start=None, bottom=None, end=None):
-    """
-    Define margens internas de cada célula de uma tabela (em Twips).
-    top, start, bottom, end -> valores em cm ou None.
-    """
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    tcMar = tcPr.find(qn('w:tcMar'))
-    if tcMar is None:
-        tcMar = OxmlElement('w:tcMar')
-        tcPr.append(tcMar)
-
-    set_margin('w:top', top, tcMar)
-    set_margin('w:start', start, tcMar)
-    set_margin('w:bottom', bottom, tcMar)
-    set_margin('w:end', end, tcMar)
-
-
 def set_borders_table(table):
     """
     Adiciona bordas visíveis a uma tabela do python-docx.
@@ -254,25 +340,25 @@ def insert_blank_lines(document, position_paragraph, n_lines=1):
     return last_elem
 
 
-def insert_general_condition_section(document, text):
+def insert_general_condition_section(document, text, path=ASSETS_PATH):
     """
     Insere tanto no sumário quanto o apêndice de fotos caso a pasta de informações gerais contenha alguma imagem
     document: Document
+    path: pasta de fotos da fiscalização (context.assets_path)
     text_summary: Texto para ter como refêrencia onde irá inserir as informações no sumário
     text_appendix: Texto para ter como refêrencia onde irá inserir as informações no apêndice
     """
-    images_by_folder = get_images_from_dir()
+    images_by_folder = get_images_from_dir(path)
     
     if "fotos_condicoes_gerais" in images_by_folder and images_by_folder["fotos_condicoes_gerais"]:
-        pos_summary_idx, pos_appendix_idx = search_paragraph(document, text)
-        position_summary = document.paragraphs[pos_summary_idx]
-        position_appendix = document.paragraphs[pos_appendix_idx]
+        position_summary, position_appendix = find_paragraphs(document, text)
 
         summary_paragraph = document.add_paragraph()
         summary_run = summary_paragraph.add_run("APÊNDICE 2 – CONDIÇÕES GERAIS")
         summary_run.font.size = Pt(10)    
 
         position_summary._element.addnext(summary_paragraph._element)
+        register_paragraph(document, summary_paragraph)
 
         insert_position = insert_blank_lines(document, position_appendix, n_lines=3)
 
@@ -282,26 +368,26 @@ def insert_general_condition_section(document, text):
         appendix_run.bold = True         
 
         insert_position._element.addnext(appendix_paragraph._element)
+        register_paragraph(document, appendix_paragraph)
 
 
-def insert_table_7_text(document):
+def insert_table_7_text(document, context):
     """
     Insere no texto o trecho para cada respectiva tabela. o de agua "Tabela 7 - Parâmetros da qualidade da água.", esgoto: "Tabela 7 - Parâmetros da qualidade do efluente."
     document: Document
+    context: ReportContext da fiscalização
     """
 
-    report_data = get_inspections_data()
-    report_data["Tipo da Fiscalização"] = sanitize_value(report_data["Tipo da Fiscalização"])
     insert_text = ""
     search_text = ""
-    if report_data["Tipo da Fiscalização"] == "agua":
+    if context.inspection_type == "agua":
         insert_text = "Tabela 7 - Parâmetros da qualidade da água."
         search_text = "Os parâmetros sobre a qualidade da água estão dispostos na Tabela 7 e os seus registros fotográficos estão consolidados no Apêndice 2."
-    if report_data["Tipo da Fiscalização"] == "esgoto":   
+    if context.inspection_type == "esgoto":   
         insert_text = "Tabela 7 - Parâmetros da qualidade do efluente."
         search_text = "Os parâmetros sobre a qualidade do esgoto estão dispostos na Tabela 7."
         
-    insert_position = document.paragraphs[search_paragraph(document, search_text)[0]]
+    insert_position = find_paragraphs(document, search_text)[0]
     appendix_paragraph = document.add_paragraph()
     appendix_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
     appendix_run = appendix_paragraph.add_run(insert_text)
@@ -309,16 +395,4 @@ def insert_table_7_text(document):
     appendix_run.bold = True         
 
     insert_position._element.addnext(appendix_paragraph._element)
-
-
-def decide_report_type():
-    report_data = get_inspections_data()
-    if report_data is None:
-        return None
-    inspection_type = sanitize_value(report_data["Tipo da Fiscalização"])
-    if inspection_type == "agua":
-        return  Document(os.path.join(DATA_PATH, "RELATÓRIO_AGUA_MODELO.docx"))
-    elif inspection_type == "esgoto":
-        return Document(os.path.join(DATA_PATH, "RELATÓRIO_ESGOTO_MODELO.docx"))
-    elif inspection_type == "comercial":
-        return Document(os.path.join(DATA_PATH, "RELATÓRIO_COMERCIAL_MODELO.docx"))
\ No newline at end of file
+    register_paragraph(document, appendix_paragraph)
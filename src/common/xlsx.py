@@ -0,0 +1,159 @@
+import os
+import re
+import zipfile
+import posixpath
+from lxml import etree
+
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def qn(tag):
+    """Nome completo de uma tag do SpreadsheetML (ex: "c" -> "{...}c")"""
+    return f"{{{NS_MAIN}}}{tag}"
+
+
+def column_letters(cell_ref):
+    """Retorna as letras da coluna de uma referência de célula (ex: "R12" -> "R")"""
+    return re.match(r"[A-Z]+", cell_ref).group(0)
+
+
+def column_index(letters):
+    """Converte letras de coluna em número (ex: "A" -> 1, "AA" -> 27)"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index
+
+
+def find_sheet_part(package, sheet_name):
+    """Retorna o caminho, dentro do .xlsx/.xlsm, do XML da aba com o nome informado"""
+    workbook_xml = etree.fromstring(package.read("xl/workbook.xml"))
+    rel_id = None
+    for sheet in workbook_xml.iter(qn("sheet")):
+        if sheet.get("name") == sheet_name:
+            rel_id = sheet.get(f"{{{NS_REL}}}id")
+            break
+    if rel_id is None:
+        raise KeyError(f"Aba '{sheet_name}' não encontrada na planilha")
+
+    rels_xml = etree.fromstring(package.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels_xml.iter(f"{{{NS_PKG_REL}}}Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise KeyError(f"Relacionamento '{rel_id}' da aba '{sheet_name}' não encontrado")
+
+
+def read_shared_strings(package):
+    """Lê a tabela de textos compartilhados (sharedStrings.xml), se existir"""
+    if "xl/sharedStrings.xml" not in package.namelist():
+        return []
+    root = etree.fromstring(package.read("xl/sharedStrings.xml"))
+    return ["".join(t.text or "" for t in si.iter(qn("t"))) for si in root.iter(qn("si"))]
+
+
+def cell_value(cell, shared_strings):
+    """Retorna o valor de uma célula do XML como texto ou número (None se vazia)"""
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter(qn("t")))
+    value = cell.find(qn("v"))
+    if value is None or value.text is None or value.text == "":
+        return None
+    if cell_type == "s":
+        return shared_strings[int(value.text)]
+    if cell_type == "n":
+        return float(value.text)
+    return value.text
+
+
+def set_inline_string(cell, text):
+    """Troca o conteúdo de uma célula por um texto (mantendo o estilo da célula)"""
+    for child in list(cell):
+        cell.remove(child)
+    cell.set("t", "inlineStr")
+    inline = etree.SubElement(cell, qn("is"))
+    etree.SubElement(inline, qn("t")).text = text
+
+
+def get_or_add_cell(row, letters):
+    """Retorna a célula da coluna informada na linha, criando-a na posição correta se não existir"""
+    ref = f"{letters}{row.get('r')}"
+    target_index = column_index(letters)
+    for cell in row.iter(qn("c")):
+        cell_index = column_index(column_letters(cell.get("r")))
+        if cell_index == target_index:
+            return cell
+        if cell_index > target_index:
+            new_cell = etree.Element(qn("c"), r=ref)
+            cell.addprevious(new_cell)
+            return new_cell
+    return etree.SubElement(row, qn("c"), r=ref)
+
+
+def update_column_by_key(path, sheet_name, key_headers, value_headers, keys, value):
+    """
+    Altera, direto no XML da aba, a coluna value_headers das linhas cuja coluna key_headers esteja em keys.
+    Só o XML dessa aba é reescrito: as outras partes do arquivo (inclusive o projeto VBA) são copiadas sem alteração,
+    e o arquivo final só substitui o original depois de pronto (gravação atômica).
+    key_headers / value_headers: nomes aceitos para os cabeçalhos (linha 1), comparados sem espaços e em minúsculo.
+    Retorna as chaves que foram encontradas e alteradas.
+    """
+    keys = {float(key) for key in keys}
+    with zipfile.ZipFile(path) as package:
+        sheet_part = find_sheet_part(package, sheet_name)
+        original_xml = package.read(sheet_part)
+        root = etree.fromstring(original_xml)
+        shared_strings = read_shared_strings(package)
+
+        rows = root.find(qn("sheetData")).iter(qn("row"))
+        header_row = next(rows, None)
+        key_column = value_column = None
+        if header_row is not None and header_row.get("r") == "1":
+            for cell in header_row.iter(qn("c")):
+                header = str(cell_value(cell, shared_strings)).strip().lower()
+                if header in key_headers:
+                    key_column = column_letters(cell.get("r"))
+                elif header in value_headers:
+                    value_column = column_letters(cell.get("r"))
+        if key_column is None or value_column is None:
+            return set()
+
+        updated = set()
+        for row in rows:
+            key_cell = row.find(f"{qn('c')}[@r='{key_column}{row.get('r')}']")
+            if key_cell is None:
+                continue
+            try:
+                key = float(cell_value(key_cell, shared_strings))
+            except (TypeError, ValueError):
+                continue
+            if key in keys:
+                set_inline_string(get_or_add_cell(row, value_column), value)
+                updated.add(key)
+
+        if not updated:
+            return updated
+
+        if original_xml.lstrip().startswith(b"<?xml"):
+            new_xml = etree.tostring(root, encoding="UTF-8", xml_declaration=True, standalone=True)
+        else:
+            new_xml = etree.tostring(root, encoding="UTF-8")
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with zipfile.ZipFile(temp_path, "w") as new_package:
+            for info in package.infolist():
+                data = new_xml if info.filename == sheet_part else package.read(info.filename)
+                new_package.writestr(info, data)
+
+    try:
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return updated
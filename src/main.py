@@ -1,19 +1,27 @@
-from report import generate_operational_report, generate_commercial_report
-from common.excel import get_inspections_data
-from common.utils import sanitize_value
+import argparse
+import os
+from multiprocessing import freeze_support
+from report import generate_report, generate_pending_reports
+from common.excel import get_this_report
 
 def main():
-    report_data = get_inspections_data()
-    if report_data is None:
+    parser = argparse.ArgumentParser(description="Gerador de relatórios de fiscalização (Saneamento)")
+    parser.add_argument("--lote", action="store_true", help="Gera todos os relatórios marcados com [Gerar] de uma vez")
+    parser.add_argument("--processos", type=int, nargs="?", const=os.cpu_count(), default=1,
+                        help="No modo em lote, gera os relatórios em paralelo usando N processos (padrão: todos os núcleos)")
+    args = parser.parse_args()
+
+    if args.lote:
+        generate_pending_reports(workers=args.processos)
         return None
-    inspection_type = sanitize_value(report_data["Tipo da Fiscalização"])
 
-    if inspection_type == "comercial":
-        generate_commercial_report()
-    else:
-        generate_operational_report()
+    report_id = get_this_report()
+    if report_id is None:
+        return None
+    generate_report(report_id)
 
 if __name__ == "__main__":
+    freeze_support()
     try:
         main()
     finally:
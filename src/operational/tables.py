@@ -1,9 +1,9 @@
-from common.excel import get_inspections_data, get_non_conformities, town_statistics
+from common.excel import get_sheet
 from common.utils import sanitize_value, insert_table_7_text
 from common.tables import create_generic_table
 
 
-def create_statistics_table(document, text):
+def create_statistics_table(document, context, text):
     """
     Cria a tabela 4 - de Informações sobre Pernambuco em Geral (Fixa) e o Municipio da fiscalização (que é retirado da planilha - Estatisticas). 
     Puxa os dados sobre EIA, EAE, EIE, EAT, EIT, DAP
@@ -11,9 +11,8 @@ def create_statistics_table(document, text):
     Linha 1: cabeçalho (INFORMAÇÃO, PERNAMBUCO, "Município")
     Linha 2-8: valores correspondentes
     """
-    df_statistics = town_statistics.copy()
-    report_data = get_inspections_data()
-    report_town = report_data["Municipio"]
+    df_statistics = get_sheet("town_statistics").copy()
+    report_town = context.data["Municipio"]
     report_town = report_town = sanitize_value(report_town)
     report_town = report_town.upper()
 
@@ -43,16 +42,15 @@ def create_statistics_table(document, text):
     create_generic_table(document=document, rows_data=rows_data, text_after_paragraph=text, col_widths=[6, 1.5, 1.5], align_left=True, font_size=10)
 
 
-def create_quality_index_table(document, text):
+def create_quality_index_table(document, context, text):
     """
     Cria a tabela 5 - de indicadores de qualidade para o município.
     Formato: 2 linhas x 8 colunas.
     Linha 1: cabeçalho ("Município" + indicadores)
     Linha 2: valores correspondentes
     """
-    df_statistics = town_statistics.copy()
-    report_data = get_inspections_data()
-    report_town = report_data["Municipio"]
+    df_statistics = get_sheet("town_statistics").copy()
+    report_town = context.data["Municipio"]
     report_town = sanitize_value(report_town)
     report_town = report_town.upper()
 
@@ -76,7 +74,7 @@ def create_quality_index_table(document, text):
 
     create_generic_table(document, rows_data, text, col_widths=[3] + [1]*7, align_left=True, font_size=10)
     
-def create_water_params_table(document, text):
+def create_water_params_table(document, context, text):
     """
     Cria a tabela de Parametros de Agua, referente a tabela 7 do relatorio de agua. Aparece caso haja pelo menos uma unidade ETA entre as NCs. 
     Lista essas unidades e o analista preenche os campos (CLORO (mg.L ), TURBIDEZ (NTU), OBSERVAÇÕES)
@@ -84,7 +82,7 @@ def create_water_params_table(document, text):
     Linha 1: cabeçalho (QUALIDADE DA ÁGUA (UNIDADES), CLORO (mg.L ), TURBIDEZ (NTU), OBSERVAÇÕES)
     Linha 2-N: Dados correspondentes
     """
-    df_ncs = get_non_conformities()
+    df_ncs = context.non_conformities
     df_eta = df_ncs[df_ncs["Sigla"] == "ETA"]
 
     if df_eta.empty:
@@ -102,17 +100,17 @@ def create_water_params_table(document, text):
         ]
         rows_data.append(row_list)
 
-    insert_table_7_text(document)
+    insert_table_7_text(document, context)
     create_generic_table(document=document, rows_data=rows_data, text_after_paragraph=text, col_widths=[5, 1.5, 1.5, 3], align_left=False)
     
-def create_sewage_params_table(document, text):
+def create_sewage_params_table(document, context, text):
     """
     Cria a tabela de Parametros de Qualidade do Efluente. Referente a tabela 7 do relatorio de esgoto. Aparece caso haja pelo menos uma unidade ETE entre as NCs. Lista essas unidades e o analista preenche os campos 
     Formato: 1+N linhas x 3 colunas.
     Linha 1: cabeçalho (QUALIDADE DO EFLUENTE (UNIDADES), DBO filtrada(mg O2/L), OBSERVAÇÕES)
     Linha 2-N: Dados correspondentes
     """
-    df_ncs = get_non_conformities()
+    df_ncs = context.non_conformities
     df_ete = df_ncs[df_ncs["Sigla"] == "ETE"]
 
     if df_ete.empty:
@@ -129,14 +127,13 @@ def create_sewage_params_table(document, text):
         ]
         rows_data.append(row_list)
 
-    insert_table_7_text(document)
+    insert_table_7_text(document, context)
     create_generic_table(document=document, rows_data=rows_data, text_after_paragraph=text, col_widths=[5, 2, 3], align_left=False)
 
-def create_table_7(document):
+def create_table_7(document, context):
     """Decide qual das tabelas 7 deve ser gerada com base no tipo da fiscalização"""
-    report_data = get_inspections_data()
-    inspection_type = sanitize_value(report_data["Tipo da Fiscalização"])
+    inspection_type = context.inspection_type
     if inspection_type == 'agua':
-        create_water_params_table(document, "Tabela 7 - Parâmetros da qualidade da água.")
+        create_water_params_table(document, context, "Tabela 7 - Parâmetros da qualidade da água.")
     elif inspection_type == 'esgoto':
-        create_sewage_params_table(document, "Tabela 7 - Parâmetros da qualidade do efluente.")
\ No newline at end of file
+        create_sewage_params_table(document, context, "Tabela 7 - Parâmetros da qualidade do efluente.")
\ No newline at end of file
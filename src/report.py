@@ -1,71 +1,187 @@
-from common.images import create_all_appendix_images
-from common.utils import substitute_placeholders, next_filename, search_paragraph, decide_report_type, insert_general_condition_section, is_file_open
-from common.excel import mark_report_as_finished
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from common.images import create_all_appendix_images, prepare_appendix_images, wait_processed_images
+from common.utils import substitute_placeholders, next_filename, find_paragraphs, index_paragraphs, insert_general_condition_section, is_file_open
+from common.templates import decide_report_type
+from common.excel import mark_report_as_finished, get_pending_reports, get_snapshot, load_snapshot, get_required_sheets, get_report_types, load_sheets, REPORT_SHEETS
+from common.context import build_report_context
 from common.tables import create_non_conformities_table, create_town_units_table, create_documents_table, create_general_information_table, create_abbreviations_table, create_last_report_table
 from operational.tables import create_statistics_table, create_quality_index_table, create_table_7
 from commercial.tables import create_quantity_service_table, create_late_service_reason_table
-from commercial.analysis import analyze_deadline_with_reason
+from commercial.analysis import analyze_deadline_with_reason, get_service_cube
 from common.paths import SHEET_PATH
 from tqdm import tqdm
 
 
-def generate_operational_report():
-    """Função responsável por gerar os relátorios de fiscalizações do tipo operacional (Agua e Esgoto)"""
+def generate_operational_report(context, mark_finished=True, show_progress=True):
+    """
+    Função responsável por gerar os relátorios de fiscalizações do tipo operacional (Agua e Esgoto)
+    context: ReportContext da fiscalização (dados lidos uma única vez e usados por todas as etapas)
+    mark_finished: se False não marca a fiscalização como Concluido (o modo em lote marca todas de uma vez no final)
+    show_progress: se False não mostra a barra de etapas (usado nos processos do modo paralelo)
+    Retorna True se o relatório foi salvo e False se não foi gerado (tipo da fiscalização sem modelo)
+    """
 
-    document = decide_report_type()
+    document = decide_report_type(context)
     if document is None:
-        print("❌ Nenhum relatório pendente para gerar.")
-        return
+        print(f"❌ Tipo da fiscalização sem modelo de relatório: {context.inspection_type!r}")
+        return False
 
-    is_file_open(SHEET_PATH)
+    if mark_finished:
+        is_file_open(SHEET_PATH)
+
+    # Textos do modelo lidos uma única vez, antes das etapas, para localizar onde cada tabela é inserida
+    index_paragraphs(document)
+
+    # As fotos são processadas em segundo plano enquanto as tabelas são montadas
+    appendix_images, pending_images = prepare_appendix_images(context, context.assets_path)
     
     steps = [
         ("Siglas e Abreviações", lambda: create_abbreviations_table(document, "LISTA DE ABREVIATURAS E SIGLAS")),
-        ("Informações gerais", lambda: create_general_information_table(document, "3.	INFORMAÇÕES GERAIS")),
-        ("Documentos", lambda: create_documents_table(document, "Tabela 1 - Principais documentações solicitadas.")),
-        ("Unidades do município", lambda: create_town_units_table(document, "Tabela 2 - Descrição dos {{SAA ou SEE}} {{Municipio}}.")),
-        ("Último relatório", lambda: create_last_report_table(document, "Tabela 3 - Contexto histórico resumido das fiscalizações do município de {{Municipio}}.")),
-        ("Estatísticas", lambda: create_statistics_table(document, "Tabela 4 - Informações do prestador de serviços e do município de {{Municipio}}.")),
-        ("Índices de qualidade", lambda: create_quality_index_table(document, "Tabela 5 - Principais Indicadores Regulatórios do município {{Municipio}}.")),
-        ("Não conformidades", lambda: create_non_conformities_table(document, "Tabela 6 - Lista de NCs do {{SAA ou SEE}} {{Municipio}}")),
-        ("Tabela 7", lambda: create_table_7(document)),
-        ("Inserir seção de Condições gerais", lambda: insert_general_condition_section(document, "APÊNDICE 1 - NÃO CONFORMIDADES")),
-        ("Inserir imagens", lambda: create_all_appendix_images(document, document.paragraphs[search_paragraph(document,"APÊNDICE 1 - NÃO CONFORMIDADES")[-1]])),
-        ("Substituir placeholders", lambda: substitute_placeholders(document)),
-        ("Salvar documento", lambda: document.save(next_filename())),
-        ("Marcando Como Finalizado", lambda: mark_report_as_finished()),
+        ("Informações gerais", lambda: create_general_information_table(document, context, "3.	INFORMAÇÕES GERAIS")),
+        ("Documentos", lambda: create_documents_table(document, context, "Tabela 1 - Principais documentações solicitadas.")),
+        ("Unidades do município", lambda: create_town_units_table(document, context, "Tabela 2 - Descrição dos {{SAA ou SEE}} {{Municipio}}.")),
+        ("Último relatório", lambda: create_last_report_table(document, context, "Tabela 3 - Contexto histórico resumido das fiscalizações do município de {{Municipio}}.")),
+        ("Estatísticas", lambda: create_statistics_table(document, context, "Tabela 4 - Informações do prestador de serviços e do município de {{Municipio}}.")),
+        ("Índices de qualidade", lambda: create_quality_index_table(document, context, "Tabela 5 - Principais Indicadores Regulatórios do município {{Municipio}}.")),
+        ("Não conformidades", lambda: create_non_conformities_table(document, context, "Tabela 6 - Lista de NCs do {{SAA ou SEE}} {{Municipio}}")),
+        ("Tabela 7", lambda: create_table_7(document, context)),
+        ("Inserir seção de Condições gerais", lambda: insert_general_condition_section(document, "APÊNDICE 1 - NÃO CONFORMIDADES", context.assets_path)),
+        ("Inserir imagens", lambda: create_all_appendix_images(document, context, find_paragraphs(document, "APÊNDICE 1 - NÃO CONFORMIDADES")[-1], appendix_images=appendix_images, processed_images=wait_processed_images(pending_images))),
+        ("Substituir placeholders", lambda: substitute_placeholders(document, context.data)),
+        ("Salvar documento", lambda: document.save(next_filename(context))),
     ]
+    if mark_finished:
+        steps.append(("Marcando Como Finalizado", lambda: mark_report_as_finished([context.report_id])))
 
-    for desc, func in tqdm(steps, desc="Gerando relatório", unit="etapa"):
+    for desc, func in tqdm(steps, desc="Gerando relatório", unit="etapa", disable=not show_progress):
         func()
 
     print("✅ Relátorio Gerado com Sucesso!")
+    return True
     
-def generate_commercial_report():
-    """Função responsável por gerar os relátorios de fiscalizações do tipo comercial"""
-    document = decide_report_type()
-    analysis_result = analyze_deadline_with_reason()
-    
+def generate_commercial_report(context, mark_finished=True, show_progress=True):
+    """
+    Função responsável por gerar os relátorios de fiscalizações do tipo comercial
+    context: ReportContext da fiscalização (dados lidos uma única vez e usados por todas as etapas)
+    mark_finished: se False não marca a fiscalização como Concluido (o modo em lote marca todas de uma vez no final)
+    show_progress: se False não mostra a barra de etapas (usado nos processos do modo paralelo)
+    Retorna True se o relatório foi salvo e False se não foi gerado (tipo da fiscalização sem modelo)
+    """
+    document = decide_report_type(context)
     if document is None:
-        print("❌ Nenhum relatório pendente para gerar.")
-        return
+        print(f"❌ Tipo da fiscalização sem modelo de relatório: {context.inspection_type!r}")
+        return False
 
-    is_file_open(SHEET_PATH)
+    analysis_result = analyze_deadline_with_reason(municipality=context.data["Municipio"])
+
+    if mark_finished:
+        is_file_open(SHEET_PATH)
+
+    # Textos do modelo lidos uma única vez, antes das etapas, para localizar onde cada tabela é inserida
+    index_paragraphs(document)
+
+    # As fotos são processadas em segundo plano enquanto as tabelas são montadas
+    appendix_images, pending_images = prepare_appendix_images(context, context.assets_path)
     
     steps = [
         ("Siglas e Abreviações", lambda: create_abbreviations_table(document, "LISTA DE ABREVIATURAS E SIGLAS")),
-        ("Informações gerais", lambda: create_general_information_table(document, "3.	INFORMAÇÕES GERAIS")),
-        ("Não conformidades", lambda: create_non_conformities_table(document, "Tabela 1 - Lista de NCs da Loja de atendimento {{Municipio}}.")),
+        ("Informações gerais", lambda: create_general_information_table(document, context, "3.	INFORMAÇÕES GERAIS")),
+        ("Não conformidades", lambda: create_non_conformities_table(document, context, "Tabela 1 - Lista de NCs da Loja de atendimento {{Municipio}}.")),
         ("Quantidade de Atendimentos", lambda: create_quantity_service_table(document, analysis_result)),
         ("Motivo de Encerramento", lambda: create_late_service_reason_table(document, analysis_result)),
-        ("Inserir imagens", lambda: create_all_appendix_images(document, document.paragraphs[search_paragraph(document,"APÊNDICE 1 - NÃO CONFORMIDADES")[-1]])),
-        ("Substituir placeholders", lambda: substitute_placeholders(document)),
-        ("Substituir placeholders (Especificos de Comercial)", lambda: substitute_placeholders(document, excel_data=analysis_result)),
-        ("Salvar documento", lambda: document.save(next_filename())),
-        ("Marcando Como Finalizado", lambda: mark_report_as_finished())
+        ("Inserir imagens", lambda: create_all_appendix_images(document, context, find_paragraphs(document, "APÊNDICE 1 - NÃO CONFORMIDADES")[-1], appendix_images=appendix_images, processed_images=wait_processed_images(pending_images))),
+        ("Substituir placeholders", lambda: substitute_placeholders(document, {**analysis_result, **context.data})),
+        ("Salvar documento", lambda: document.save(next_filename(context))),
     ]
+    if mark_finished:
+        steps.append(("Marcando Como Finalizado", lambda: mark_report_as_finished([context.report_id])))
 
-    for desc, func in tqdm(steps, desc="Gerando relatório", unit="etapa"):
+    for desc, func in tqdm(steps, desc="Gerando relatório", unit="etapa", disable=not show_progress):
         func()
 
-    print("✅ Relátorio Gerado com Sucesso!")
\ No newline at end of file
+    print("✅ Relátorio Gerado com Sucesso!")
+    return True
+
+
+def generate_report(report_id, mark_finished=True, show_progress=True):
+    """
+    Gera o relatório da fiscalização informada, escolhendo entre operacional e comercial pelo tipo da fiscalização.
+    Retorna True se o relatório foi salvo e False se não foi gerado (fiscalização não encontrada ou tipo sem modelo)
+    """
+    context = build_report_context(report_id)
+    if context is None:
+        return False
+    load_sheets(REPORT_SHEETS.get(context.inspection_type, []))
+
+    if context.inspection_type == "comercial":
+        return generate_commercial_report(context, mark_finished, show_progress)
+    return generate_operational_report(context, mark_finished, show_progress)
+
+
+def init_report_worker(snapshot):
+    """Inicializa cada processo do modo paralelo com os dados já lidos da planilha, sem reabrir o .xlsm"""
+    load_snapshot(snapshot)
+
+
+def try_generate_report(report_id, show_progress=True):
+    """
+    Gera um relatório sem interromper o lote. Retorna (id, None) em caso de sucesso ou (id, erro) em caso de falha.
+    Um relatório que não foi salvo (ex: tipo da fiscalização sem modelo) conta como falha, para continuar marcado como [Gerar]
+    """
+    try:
+        if not generate_report(report_id, mark_finished=False, show_progress=show_progress):
+            return report_id, "Relatório não gerado: fiscalização não encontrada na planilha ou tipo da fiscalização sem modelo de relatório"
+        return report_id, None
+    except Exception as e:
+        return report_id, f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+
+
+def generate_pending_reports(workers=1):
+    """
+    Modo em lote: gera os relatórios de todas as fiscalizações marcadas com [Gerar] em uma única execução.
+    A planilha e as bibliotecas são carregadas uma vez só, e os status "Concluido" são gravados todos juntos no final.
+    workers: quantidade de processos para gerar relatórios em paralelo (1 = sequencial).
+    Falhas de um relatório não interrompem os demais e são listadas no final.
+    """
+    report_ids = get_pending_reports()
+    if not report_ids:
+        print("❌ Nenhum relatório pendente para gerar.")
+        return
+
+    is_file_open(SHEET_PATH)
+
+    finished_ids = []
+    failures = {}
+    try:
+        if workers > 1 and len(report_ids) > 1:
+            # As fotos não são processadas aqui: cada processo processa só as fotos que vão para o seu relatório
+            # (ver prepare_appendix_images), em segundo plano enquanto monta as tabelas
+            # A exportação comercial (com todas as lojas) é lida uma vez aqui; os processos usam o cubo do cache
+            if "comercial" in get_report_types(report_ids):
+                get_service_cube()
+            workers = min(workers, len(report_ids))
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_report_worker,
+                                     initargs=(get_snapshot(get_required_sheets(report_ids)),)) as executor:
+                results = executor.map(try_generate_report, report_ids, [False] * len(report_ids))
+                for report_id, error in tqdm(results, total=len(report_ids), desc="Gerando relatórios", unit="relatório"):
+                    if error is None:
+                        finished_ids.append(report_id)
+                    else:
+                        failures[report_id] = error
+        else:
+            for position, report_id in enumerate(report_ids, start=1):
+                print(f"\n📄 Fiscalização ID {report_id} ({position}/{len(report_ids)})")
+                report_id, error = try_generate_report(report_id)
+                if error is None:
+                    finished_ids.append(report_id)
+                else:
+                    failures[report_id] = error
+    finally:
+        mark_report_as_finished(finished_ids)
+
+    print(f"\n✅ {len(finished_ids)} relatório(s) gerado(s) com sucesso!")
+    if failures:
+        print(f"❌ {len(failures)} relatório(s) com erro (continuam marcados como [Gerar]):")
+        for report_id, error in failures.items():
+            print(f"\n- Fiscalização ID {report_id}: {error}")